@@ -1,8 +1,7 @@
-import os, importlib, asyncio
+import os, importlib, asyncio, functools, gc, shutil, signal, socket, tempfile, time, traceback
+from typing import Dict, List, Optional
 from urllib.parse import urlparse
 
-from concurrent.futures import ThreadPoolExecutor
-
 import yaml
 
 with open("config.yml", "r") as f:
@@ -12,21 +11,35 @@ from fastapi import FastAPI, Request
 from fastapi import status, HTTPException
 from fastapi.responses import JSONResponse, RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.middleware.trustedhost import TrustedHostMiddleware
 import uvicorn
 # near other imports
-from db import init_db, engine
+from db import init_db, engine, configure_sqlite
 import crud
 from helpers.storage import init_storage, save_chart_file
-from models import User, Song, UserUnlock, SQLModel
+from models import IngestJob, User, Song, UserUnlock, SQLModel
 from fastapi import Depends, UploadFile, File
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 
 from helpers.repository_map import repo
+from helpers.data_compilers import get_warm, load_static_levels_startup
+from helpers.ingest import IngestWorker
+from helpers.middleware import (
+    MetricsMiddleware,
+    ProfilerMiddleware,
+    SonolusMiddleware,
+)
+from helpers.metrics import metrics
+from helpers.profiler import profiler
+from helpers.server_stats import server_stats
+from helpers.executors import (
+    ExecutorSaturated,
+    create_bounded_executors,
+    executor_pools,
+)
 
 debug = False
+# set in the pre-fork master, so workers skip init_db
+db_initialized = False
 
 
 class SonolusFastAPI(FastAPI):
@@ -34,40 +47,68 @@ class SonolusFastAPI(FastAPI):
         super().__init__(*args, **kwargs)
         self.debug = kwargs["debug"]
 
-        self.executor = ThreadPoolExecutor(max_workers=16)
+        # named io/compile/cpu/render pools, each behind a bounded queue
+        executor_pools.configure(kwargs.get("executors"))
+        self.executors = create_bounded_executors(executor_pools)
+        # pragmas for sonolus.db connections (WAL, synchronous, mmap, ...)
+        configure_sqlite(kwargs.get("sqlite"))
 
         self.config = kwargs["config"]
         self.base_url = kwargs["base_url"]
 
         self.repository = repo
+        # compiles uploads into the catalog, see helpers/ingest.py
+        self.ingest = IngestWorker(kwargs.get("dynamic_engine"))
 
         self.exception_handlers.setdefault(HTTPException, self.http_exception_handler)
+        self.exception_handlers.setdefault(
+            ExecutorSaturated, self.executor_saturated_handler
+        )
 
         # do NOT compile all static assets at startup for dynamic mode.
         # We'll still allow a small compile-on-demand but avoid blocking startup.
         
-    async def reload_dynamic_repo(self):
-        # scan dynamic storage and update internal repo mapping or DB
-        # (For now, rely on DB; this method can be used to rebuild in-memory caches)
-        pass
-
-    async def compile_and_register(self, uid: str, filename: str, title: str, default_locked=False):
-        # called when file uploaded
-        # Save DB record and optionally run compile logic in a background thread
-        # Save record to DB (sync helper for simplicity)
-        path = f"{init_storage}"  # placeholder - actual path was returned by save_chart_file
-        # We'll instead call crud.create_song_sync in background tasks where appropriate
-        return
-
-
-        compile_static_levels_list(
-            self.base_url
-        )  # this might take time, maybe compile now?
-
-    async def run_blocking(self, func, *args, **kwargs):
-        return await asyncio.get_event_loop().run_in_executor(
-            self.executor, lambda: func(*args, **kwargs)
+    async def reload_dynamic_repo(self) -> int:
+        """
+        Publishes uploads that finished compiling (on any worker) into this
+        worker's catalog now, instead of at the ingest worker's next poll.
+        """
+        return await self.ingest.publish_finished(self)
+
+    async def compile_and_register(
+        self, uid: str, path: str, title: str, default_locked=False
+    ) -> IngestJob:
+        """
+        Called when a chart is uploaded: saves the song and queues it for
+        compiling into the catalog. Returns the ingest job to follow.
+        """
+        await crud.create_song(
+            song_id=uid, title=title, path=path, default_locked=default_locked
         )
+        job = await crud.enqueue_ingest_job(uid, path)
+        self.ingest.wake()
+        return job
+
+    async def run_blocking(self, func, *args, pool: str = "io", **kwargs):
+        """
+        Runs func in the named pool: "io" for file reads, "compile" for
+        catalog compiles, "cpu"/"render"/"auth" (process pools) for picklable
+        pure work. Raises ExecutorSaturated (-> 503, or the pool's configured
+        status) when that pool's queue is full.
+        """
+        if kwargs:
+            func = functools.partial(func, **kwargs)
+        return await self.executors[pool].run(func, *args)
+
+    async def run_cached(self, func, *args, **kwargs):
+        """
+        run_blocking for compile functions: if the result is already
+        compiled, return it right away instead of hopping to the executor.
+        """
+        data = get_warm(func, *args)
+        if data is not None:
+            return data
+        return await self.run_blocking(func, *args, pool="compile", **kwargs)
 
     def get_items_per_page(self, route: str) -> int:
         return self.config["items-per-page"].get(
@@ -82,22 +123,27 @@ class SonolusFastAPI(FastAPI):
         else:
             return JSONResponse(status_code=exc.status_code)
 
-
-VERSION_REGEX = r"^\d+\.\d+\.\d+$"
+    async def executor_saturated_handler(
+        self, request: Request, exc: ExecutorSaturated
+    ):
+        # 503 by default; pools guarding per-client work (auth) use 429
+        return JSONResponse(
+            content={"message": "Server is busy, try again later."},
+            status_code=exc.status,
+            headers={"Retry-After": str(exc.retry_after)},
+        )
 
 
-class SonolusMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        request.state.localization = request.query_params.get("localization", "en")
-        response = await call_next(request)
-        response.headers["Sonolus-Version"] = request.app.config[
-            "required-client-version"
-        ]
-        return response
+VERSION_REGEX = r"^\d+\.\d+\.\d+$"
 
 
 app = SonolusFastAPI(
-    debug=debug, config=config["sonolus"], base_url=config["server"]["base-url"]
+    debug=debug,
+    config=config["sonolus"],
+    base_url=config["server"]["base-url"],
+    executors=config["server"].get("executors"),
+    sqlite=config["server"].get("sqlite"),
+    dynamic_engine=config["server"].get("dynamic-engine"),
 )
 app.add_middleware(
     CORSMiddleware,
@@ -106,25 +152,109 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-app.add_middleware(SonolusMiddleware)
+app.add_middleware(
+    SonolusMiddleware,
+    version=config["sonolus"]["required-client-version"],
+    force_https=config["server"]["force-https"] and not debug,
+)
+app.add_middleware(ProfilerMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+# BoundedExecutor.snapshot() key -> (metric, help, kind, how workers merge)
+EXECUTOR_METRICS = {
+    "queued": (
+        "sonolus_executor_queued",
+        "Jobs waiting for a worker, per pool.",
+        "gauge",
+        "sum",
+    ),
+    "running": (
+        "sonolus_executor_running",
+        "Jobs a worker is running (in flight), per pool.",
+        "gauge",
+        "sum",
+    ),
+    "pending": (
+        "sonolus_executor_pending",
+        "Jobs running or waiting, per pool.",
+        "gauge",
+        "sum",
+    ),
+    "workers": (
+        "sonolus_executor_workers",
+        "Workers per pool.",
+        "gauge",
+        "sum",
+    ),
+    "maxQueue": (
+        "sonolus_executor_max_queue",
+        "Jobs allowed to wait before the pool rejects more, per pool.",
+        "gauge",
+        "sum",
+    ),
+    "submitted": (
+        "sonolus_executor_submitted_total",
+        "Jobs accepted by the pool.",
+        "counter",
+        "sum",
+    ),
+    "rejected": (
+        "sonolus_executor_rejected_total",
+        "Jobs turned away with a 503 because the pool's queue was full.",
+        "counter",
+        "sum",
+    ),
+    "waitSecondsTotal": (
+        "sonolus_executor_wait_seconds_total",
+        "Total time jobs spent queued before a worker picked them up.",
+        "counter",
+        "sum",
+    ),
+    "waitSecondsMax": (
+        "sonolus_executor_wait_seconds_max",
+        "Longest any job spent queued before a worker picked it up.",
+        "gauge",
+        "max",
+    ),
+}
+
+# values that live elsewhere, read when /metrics is scraped
+for key, (name, help, kind, merge) in EXECUTOR_METRICS.items():
+    metrics.collector(
+        name,
+        help,
+        ("pool",),
+        lambda key=key: {
+            (pool,): e.snapshot()[key] for pool, e in app.executors.items()
+        },
+        kind=kind,
+        merge=merge,
+    )
+metrics.collector(
+    "sonolus_catalog_items",
+    "Items in the catalog by type.",
+    ("item_type",),
+    lambda: {(t,): n for t, n in server_stats.items.items()},
+    merge="max",
+)
+metrics.collector(
+    "sonolus_catalog_bytes",
+    "Size on disk of the catalog by type.",
+    ("item_type",),
+    lambda: {(t,): n for t, n in server_stats.bytes.items()},
+    merge="max",
+)
+metrics.collector(
+    "sonolus_repository_cache_bytes",
+    "Bytes held by the repository file cache.",
+    (),
+    lambda: {(): repo._cache_bytes},
+)
 if not debug:
     domain = urlparse(config["server"]["base-url"]).netloc
     app.add_middleware(TrustedHostMiddleware, allowed_hosts=["*", "charts.kizuruki.com"])
 
 
-@app.middleware("http")
-async def force_https_redirect(request, call_next):
-    response = await call_next(request)
-
-    if config["server"]["force-https"] and not debug:
-        if response.headers.get("Location"):
-            response.headers["Location"] = response.headers.get("Location").replace(
-                "http://", "https://", 1
-            )
-
-    return response
-
-
 # app.mount("/static", StaticFiles(directory="static"), name="static")
 # templates = Jinja2Templates(directory="templates")
 
@@ -198,11 +328,28 @@ def loadRoutes(folder, cleanup: bool = True):
 
 
 async def startup_event():
-    # init DB
-    await init_db()
+    # pools are only started here, i.e. after any fork into workers
+    executor_pools.start()
+    if metrics.shared_dir:
+        app.state.metrics_flush = asyncio.create_task(metrics.flush_periodically())
+    if profiler.shared_dir:
+        app.state.profiler_follow = asyncio.create_task(profiler.follow())
+    # the compiled catalog is read in the background, so the server answers
+    # (e.g. /sonolus/info) while it loads; level compiles wait for it
+    app.state.catalog_load = asyncio.create_task(
+        app.run_blocking(load_static_levels_startup)
+    )
+
+    # init DB (the pre-fork master already did, see serve_workers)
+    if not db_initialized:
+        await init_db()
 
     # init dynamic storage
     init_storage(config["server"])
+    if config["server"].get("enable-dynamic", True):
+        # compiles queued uploads and publishes finished ones, including
+        # everything finished before this start
+        app.state.ingest = asyncio.create_task(app.ingest.run(app))
 
     # optionally load existing songs into repo or a cache
     print("Database and dynamic storage initialized.")
@@ -220,16 +367,132 @@ app.add_event_handler("startup", startup_event)
 # uvicorn.run("app:app", port=port, host="0.0.0.0")
 
 
-async def start_fastapi(args):
+async def start_fastapi(args, sockets: Optional[List[socket.socket]] = None):
     config_server = uvicorn.Config(
-        "app:app",
+        app,
         host="0.0.0.0",
         port=config["server"]["port"],
-        workers=8,
         # log_level="critical",
     )
     server = uvicorn.Server(config_server)
-    await server.serve()
+    await server.serve(sockets=sockets)
+
+
+async def init_db_once():
+    global db_initialized
+    await init_db()
+    # the pool's connections belong to this event loop, don't fork them
+    await engine.dispose()
+    db_initialized = True
+
+
+def preload_catalog():
+    """
+    Compile the catalog and fill the repository index in the master process,
+    so forked workers share those pages copy-on-write instead of each
+    compiling (and holding) their own copy.
+    """
+    from helpers.data_compilers import (
+        compile_banner,
+        compile_engines_list,
+        compile_static_posts_list,
+        compile_static_levels_list,
+    )
+
+    base_url = config["server"]["base-url"]
+    compile_engines_list(base_url)
+    compile_static_posts_list(base_url)
+    compile_static_levels_list(base_url)
+    compile_banner()
+    # move everything loaded so far out of the GC's reach; collections would
+    # otherwise touch every object header and un-share the pages
+    gc.freeze()
+
+
+def _run_worker(args, sock: socket.socket):
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    try:
+        asyncio.run(start_fastapi(args, sockets=[sock]))
+    except BaseException:
+        traceback.print_exc()
+        os._exit(1)
+    os._exit(0)
+
+
+def serve_workers(args, workers: int):
+    """
+    Pre-fork server: bind once, preload the catalog, fork `workers`
+    processes that all accept on the shared socket, and restart any that die.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("0.0.0.0", config["server"]["port"]))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    # create tables/indexes once: workers doing it at the same time race
+    # each other's checks and fail with "already exists"
+    asyncio.run(init_db_once())
+    preload_catalog()
+    # workers drop their metric snapshots here for /metrics to merge
+    # (and follow the profiler's start/stop switch through it)
+    metrics.shared_dir = tempfile.mkdtemp(prefix="sonolus-metrics-")
+    profiler.shared_dir = metrics.shared_dir
+
+    children: Dict[int, float] = {}  # pid -> spawn time
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(args, sock)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(workers):
+        spawn()
+    print(f"[SERVER] Started {workers} workers")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        spawned_at = children.pop(pid, None)
+        if stopping or spawned_at is None:
+            continue
+        print(f"[SERVER] Worker {pid} exited ({status}), restarting")
+        # don't spin if workers die right at startup
+        if time.monotonic() - spawned_at < 1:
+            time.sleep(1)
+        spawn()
+    sock.close()
+    shutil.rmtree(metrics.shared_dir, ignore_errors=True)
+
+
+def run_server(args):
+    workers = config["server"].get("workers", 1)
+    if workers > 1 and not hasattr(os, "fork"):
+        print("[WARN] Multi-process mode needs os.fork, running a single worker.")
+        workers = 1
+    if workers > 1:
+        serve_workers(args, workers)
+    else:
+        asyncio.run(start_fastapi(args))
 
 
 if __name__ == "__main__":
@@ -237,6 +500,7 @@ if __name__ == "__main__":
     
 from routes import auth as auth_routes, charts as chart_routes
 from routes import sonolus_auth, sonolus_results  # NEW
+from routes import metrics as metrics_routes, admin as admin_routes
 
 app.include_router(auth_routes.router,      prefix="/api/auth",   tags=["auth"])
 app.include_router(chart_routes.router,     prefix="/api/charts", tags=["charts"])
@@ -244,3 +508,5 @@ app.include_router(chart_routes.router,     prefix="/api/charts", tags=["charts"
 # NEW: Sonolus endpoints live at /sonolus/*
 app.include_router(sonolus_auth.router)     # defines /sonolus/authenticate + /sonolus/authenticate_external
 app.include_router(sonolus_results.router)  # defines /sonolus/levels/result/*
+app.include_router(metrics_routes.router)  # defines /metrics
+app.include_router(admin_routes.router, prefix="/api/admin", tags=["admin"])
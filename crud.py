@@ -1,13 +1,46 @@
 # crud.py
+import base64
+from datetime import datetime, timedelta
+from sqlalchemy import and_, func, literal, or_, true, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import defer
 from sqlmodel import select
-from models import User, Song, UserUnlock
-from db import engine
-from sqlmodel import Session
-from typing import Optional
-
-async def create_song_sync(song_id: str, title: str, path: str, default_locked: bool = False):
-    # helper using sync session for simplicity in background worker
-    from db import get_sync_session
+from models import IngestJob, User, Song, UserUnlock, utcnow
+from db import engine, get_session, get_sync_session
+from helpers.metrics import unlock_cache
+from helpers.ttl_cache import IntSet, TTLCache
+from typing import Collection, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# rows per INSERT statement in the bulk helpers (SQLite caps bound parameters)
+BULK_CHUNK = 500
+
+# user id -> IntSet of unlocked song ids. Unlocks made here invalidate it;
+# the TTL bounds how long another worker's unlocks can go unseen.
+UNLOCK_CACHE_USERS = 10_000
+UNLOCK_CACHE_TTL = 30
+unlocked_song_ids = TTLCache(UNLOCK_CACHE_USERS, UNLOCK_CACHE_TTL)
+
+class CachedUser(NamedTuple):
+    id: int
+    username: str
+    is_admin: bool
+
+# username -> CachedUser for auth checks; short, so is_admin changes apply soon
+USER_CACHE_TTL = 30
+users = TTLCache(UNLOCK_CACHE_USERS, USER_CACHE_TTL)
+# bumped on every unlock write, so a read that raced one isn't cached
+_unlock_writes = 0
+
+async def create_song(song_id: str, title: str, path: str, default_locked: bool = False) -> Song:
+    async with get_session() as sess:
+        s = Song(song_id=song_id, title=title, path=path, default_locked=default_locked)
+        sess.add(s)
+        await sess.commit()
+        await sess.refresh(s)
+        return s
+
+def create_song_sync(song_id: str, title: str, path: str, default_locked: bool = False) -> Song:
+    # blocking version for threads/scripts; from the event loop use create_song
     with get_sync_session() as sess:
         s = Song(song_id=song_id, title=title, path=path, default_locked=default_locked)
         sess.add(s)
@@ -15,14 +48,425 @@ async def create_song_sync(song_id: str, title: str, path: str, default_locked:
         sess.refresh(s)
         return s
 
+async def bulk_create_songs(songs: Iterable[dict]) -> int:
+    """
+    Inserts many songs (dicts of Song fields) in one transaction.
+    Fails as a whole if any song_id already exists; see bulk_upsert_songs.
+    """
+    async with get_session() as sess:
+        rows = [Song(**song) for song in songs]
+        sess.add_all(rows)
+        await sess.commit()
+        return len(rows)
+
+async def bulk_upsert_songs(songs: Iterable[dict]) -> int:
+    """
+    Inserts many songs in one transaction, updating the ones whose song_id
+    already exists (title/author/path/default_locked; id and created_at are kept).
+    """
+    # validate through the model, so defaults like created_at get filled in
+    rows = [Song(**song).model_dump(exclude={"id"}) for song in songs]
+    async with get_session() as sess:
+        for start in range(0, len(rows), BULK_CHUNK):
+            stmt = _insert(Song).values(rows[start : start + BULK_CHUNK])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Song.song_id],
+                set_={
+                    "title": stmt.excluded.title,
+                    "author": stmt.excluded.author,
+                    "path": stmt.excluded.path,
+                    "default_locked": stmt.excluded.default_locked,
+                },
+            )
+            await sess.exec(stmt)
+        await sess.commit()
+    return len(rows)
+
+def _insert(model):
+    # INSERT ... ON CONFLICT is dialect specific
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
+
 async def get_song_by_songid(song_id: str) -> Optional[Song]:
-    async with engine.connect() as conn:
-        result = await conn.execute(select(Song).where(Song.song_id == song_id))
-        return result.scalars().first()
-
-async def list_songs():
-    async with engine.connect() as conn:
-        result = await conn.execute(select(Song))
-        return result.scalars().all()
+    async with get_session() as sess:
+        result = await sess.exec(select(Song).where(Song.song_id == song_id))
+        return result.first()
+
+async def list_songs() -> List[Song]:
+    async with get_session() as sess:
+        result = await sess.exec(select(Song))
+        return result.all()
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{id}".encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Raises ValueError for anything encode_cursor didn't produce."""
+    created_at, _, id = base64.urlsafe_b64decode(cursor.encode()).decode().partition("|")
+    return datetime.fromisoformat(created_at), int(id)
+
+async def list_songs_for_user(
+    username: Optional[str],
+    limit: Optional[int],
+    after: Optional[Tuple[datetime, int]] = None,
+    query: Optional[str] = None,
+    author: Optional[str] = None,
+    locked: Optional[bool] = None,
+) -> list:
+    """
+    One page of songs (all of them if limit is None), newest first, with
+    `locked` for this user: default_locked songs they haven't unlocked.
+    `after` is the (created_at, id) of the last song of the previous page.
+    Rows are (Song, locked).
+    """
+    cached_unlocks = None
+    if username and locked is None:
+        # flags for just this page, from the user's cached unlock set;
+        # filtering on `locked` needs the join below instead
+        user_id = await get_user_id(username)
+        cached_unlocks = await get_unlocked_song_ids(user_id) if user_id else IntSet(())
+
+    if cached_unlocks is not None:
+        unlocked = None
+        is_locked = None
+    elif username:
+        # distinct, so duplicate unlock rows can't duplicate songs
+        unlocked = (
+            select(UserUnlock.song_id)
+            .join(User, User.id == UserUnlock.user_id)
+            .where(User.username == username)
+            .distinct()
+            .subquery()
+        )
+        is_locked = and_(Song.default_locked, unlocked.c.song_id.is_(None))
+    else:
+        unlocked = None
+        is_locked = Song.default_locked
+
+    if is_locked is None:
+        stmt = select(Song)
+    else:
+        stmt = select(Song, is_locked.label("locked"))
+    if unlocked is not None:
+        stmt = stmt.outerjoin(unlocked, unlocked.c.song_id == Song.id)
+    if after:
+        created_at, id = after
+        stmt = stmt.where(
+            or_(
+                Song.created_at < created_at,
+                and_(Song.created_at == created_at, Song.id < id),
+            )
+        )
+    if query:
+        stmt = stmt.where(Song.title.contains(query, autoescape=True))
+    if author:
+        stmt = stmt.where(Song.author == author)
+    if locked is not None:
+        stmt = stmt.where(is_locked if locked else ~is_locked)
+    stmt = stmt.order_by(Song.created_at.desc(), Song.id.desc()).limit(limit)
+
+    async with get_session() as sess:
+        result = await sess.exec(stmt)
+        if is_locked is not None:
+            return result.all()
+        return [
+            (song, song.default_locked and song.id not in cached_unlocks)
+            for song in result.all()
+        ]
+
+async def get_cached_user(username: str) -> Optional[CachedUser]:
+    """id and is_admin of a user, from the cache when possible."""
+    user = users.get(username)
+    if user is None:
+        row = await get_user_by_username(username)
+        if row is None:
+            return None
+        user = CachedUser(row.id, row.username, row.is_admin)
+        users.set(username, user)
+    return user
+
+async def get_user_id(username: str) -> Optional[int]:
+    user = await get_cached_user(username)
+    return user.id if user else None
+
+async def get_unlocked_song_ids(user_id: int) -> IntSet:
+    unlocked = unlocked_song_ids.get(user_id)
+    if unlocked is not None:
+        unlock_cache.inc("hit")
+        return unlocked
+    unlock_cache.inc("miss")
+    writes = _unlock_writes
+    async with get_session() as sess:
+        result = await sess.exec(
+            select(UserUnlock.song_id).where(UserUnlock.user_id == user_id)
+        )
+        unlocked = IntSet(result.all())
+    if writes == _unlock_writes:
+        unlocked_song_ids.set(user_id, unlocked)
+    return unlocked
+
+def _invalidate_unlocks(ids: Iterable[int]):
+    global _unlock_writes
+    _unlock_writes += 1
+    for user_id in ids:
+        unlocked_song_ids.pop(user_id)
+
+async def unlock_song(username: str, song_id: str) -> Optional[bool]:
+    """
+    Unlocks a song for a user in a single INSERT ... SELECT that does
+    nothing if the unlock exists. True if it was newly unlocked, False if
+    it already was, None if the user or the song doesn't exist.
+    """
+    pair = (
+        select(
+            User.id,
+            Song.id,
+            literal(utcnow(), type_=UserUnlock.__table__.c.unlocked_at.type),
+        )
+        .select_from(User)
+        .join(Song, true())
+        .where(User.username == username, Song.song_id == song_id)
+    )
+    stmt = (
+        _insert(UserUnlock)
+        .from_select(["user_id", "song_id", "unlocked_at"], pair)
+        .on_conflict_do_nothing(index_elements=["user_id", "song_id"])
+    )
+    async with get_session() as sess:
+        result = await sess.exec(stmt)
+        await sess.commit()
+        if result.rowcount:
+            _invalidate_unlocks([await get_user_id(username)])
+            return True
+        # nothing inserted: already unlocked, or a name didn't match
+        found = await sess.exec(
+            select(UserUnlock.id)
+            .join(User, User.id == UserUnlock.user_id)
+            .join(Song, Song.id == UserUnlock.song_id)
+            .where(User.username == username, Song.song_id == song_id)
+        )
+        return False if found.first() is not None else None
+
+async def grant_unlocks(usernames: List[str], song_ids: List[str]) -> dict:
+    """
+    Unlocks every song in song_ids for every user in usernames in one
+    transaction (e.g. event rewards). Existing unlocks are left alone.
+    """
+    async with get_session() as sess:
+        user_ids = await _ids_by(sess, User.username, User.id, usernames)
+        song_row_ids = await _ids_by(sess, Song.song_id, Song.id, song_ids)
+        now = utcnow()
+        rows = [
+            {"user_id": user_id, "song_id": song_id, "unlocked_at": now}
+            for user_id in user_ids.values()
+            for song_id in song_row_ids.values()
+        ]
+        granted = 0
+        for start in range(0, len(rows), BULK_CHUNK):
+            stmt = (
+                _insert(UserUnlock)
+                .values(rows[start : start + BULK_CHUNK])
+                .on_conflict_do_nothing(index_elements=["user_id", "song_id"])
+            )
+            granted += (await sess.exec(stmt)).rowcount
+        await sess.commit()
+    _invalidate_unlocks(user_ids.values())
+    return {
+        "granted": granted,
+        "already_unlocked": len(rows) - granted,
+        "missing_users": [name for name in dict.fromkeys(usernames) if name not in user_ids],
+        "missing_songs": [name for name in dict.fromkeys(song_ids) if name not in song_row_ids],
+    }
+
+async def _ids_by(sess, key, id_column, values: List[str]) -> Dict[str, int]:
+    # key -> id for the values that exist, in chunks (SQLite caps bound parameters)
+    values = list(dict.fromkeys(values))
+    found = {}
+    for start in range(0, len(values), BULK_CHUNK):
+        result = await sess.exec(
+            select(key, id_column).where(key.in_(values[start : start + BULK_CHUNK]))
+        )
+        found.update(result.all())
+    return found
+
+async def create_user(username: str, hashed_password: str) -> Optional[User]:
+    """None if the username is already taken."""
+    async with get_session() as sess:
+        user = User(username=username, hashed_password=hashed_password)
+        sess.add(user)
+        try:
+            await sess.commit()
+        except IntegrityError:
+            return None
+        await sess.refresh(user)
+        return user
+
+async def get_user_by_username(username: str) -> Optional[User]:
+    async with get_session() as sess:
+        result = await sess.exec(select(User).where(User.username == username))
+        return result.first()
+
+async def enqueue_ingest_job(song_id: str, path: str) -> IngestJob:
+    """The song's ingest job, queued unless it has one (enqueue_missing_ingest_jobs may have beaten us)."""
+    row = IngestJob(song_id=song_id, path=path).model_dump(exclude={"id"})
+    async with get_session() as sess:
+        await sess.exec(
+            _insert(IngestJob).values(row).on_conflict_do_nothing(index_elements=["song_id"])
+        )
+        await sess.commit()
+        result = await sess.exec(select(IngestJob).where(IngestJob.song_id == song_id))
+        return result.one()
+
+async def enqueue_missing_ingest_jobs() -> int:
+    """Queues every song that has no ingest job, e.g. uploads from before the queue."""
+    missing = (
+        select(
+            Song.song_id,
+            Song.path,
+            literal(utcnow(), type_=IngestJob.__table__.c.created_at.type),
+        )
+        .outerjoin(IngestJob, IngestJob.song_id == Song.song_id)
+        .where(IngestJob.id.is_(None))
+    )
+    stmt = (
+        _insert(IngestJob)
+        .from_select(["song_id", "path", "created_at"], missing)
+        .on_conflict_do_nothing(index_elements=["song_id"])
+    )
+    async with get_session() as sess:
+        result = await sess.exec(stmt)
+        await sess.commit()
+        return result.rowcount
+
+async def claim_ingest_job(lease: float, max_attempts: int) -> Optional[IngestJob]:
+    """
+    Marks the oldest queued job running and returns it; None if there's
+    nothing to do. A job still running after `lease` seconds lost its
+    worker and is claimed again, or failed once it's had max_attempts.
+    """
+    while True:
+        now = utcnow()
+        claimable = or_(
+            IngestJob.status == "queued",
+            and_(
+                IngestJob.status == "running",
+                IngestJob.claimed_at < now - timedelta(seconds=lease),
+            ),
+        )
+        async with get_session() as sess:
+            result = await sess.exec(
+                select(IngestJob).where(claimable).order_by(IngestJob.id).limit(1)
+            )
+            job = result.first()
+            if job is None:
+                return None
+            if job.attempts >= max_attempts:
+                values = {
+                    "status": "failed",
+                    "error": f"Gave up after {job.attempts} attempts",
+                    "finished_at": now,
+                }
+            else:
+                values = {"status": "running", "attempts": job.attempts + 1, "claimed_at": now}
+            # only if no other worker claimed it since it was read
+            result = await sess.exec(
+                update(IngestJob)
+                .where(
+                    IngestJob.id == job.id,
+                    IngestJob.status == job.status,
+                    IngestJob.attempts == job.attempts,
+                )
+                .values(**values)
+            )
+            await sess.commit()
+            if result.rowcount and values["status"] == "running":
+                await sess.refresh(job)
+                return job
+
+async def finish_ingest_job(job_id: int, result: Optional[str] = None, error: Optional[str] = None):
+    async with get_session() as sess:
+        await sess.exec(
+            update(IngestJob)
+            .where(IngestJob.id == job_id, IngestJob.status == "running")
+            .values(
+                status="failed" if error else "done",
+                result=result,
+                error=error,
+                finished_at=utcnow(),
+            )
+        )
+        await sess.commit()
+
+async def release_ingest_job(job_id: int):
+    # back to the queue without counting the attempt, e.g. the pool was full
+    async with get_session() as sess:
+        await sess.exec(
+            update(IngestJob)
+            .where(IngestJob.id == job_id, IngestJob.status == "running")
+            .values(status="queued", attempts=IngestJob.attempts - 1, claimed_at=None)
+        )
+        await sess.commit()
+
+async def retry_ingest_job(job_id: int) -> Optional[IngestJob]:
+    """
+    Queues a failed job again as a new job: a new id, so every worker's
+    scan for finished jobs (finished_ingest_jobs) reaches it. None unless
+    the job exists and failed.
+    """
+    async with get_session() as sess:
+        job = await sess.get(IngestJob, job_id)
+        if job is None or job.status != "failed":
+            return None
+        await sess.delete(job)
+        await sess.flush()
+        retry = IngestJob(song_id=job.song_id, path=job.path)
+        sess.add(retry)
+        await sess.commit()
+        await sess.refresh(retry)
+        return retry
+
+async def finished_ingest_jobs(
+    floor: int, skip: Collection[int], limit: int = BULK_CHUNK
+) -> Tuple[List[IngestJob], int]:
+    """
+    Done jobs with ids from `floor` on, except the ids in `skip` (already
+    seen), oldest first, and the floor to pass next time: every job below
+    it is finished, so only the ones since the oldest unfinished job (and
+    new ones) are looked at again.
+    """
+    async with get_session() as sess:
+        # read before the done jobs, so a job finishing in between is in
+        # the next call's range
+        result = await sess.exec(
+            select(func.min(IngestJob.id)).where(IngestJob.status.in_(("queued", "running")))
+        )
+        next_floor = result.one()
+        if next_floor is None:
+            result = await sess.exec(select(func.max(IngestJob.id)))
+            next_floor = (result.one() or 0) + 1
+        stmt = select(IngestJob).where(IngestJob.status == "done", IngestJob.id >= floor)
+        if skip:
+            stmt = stmt.where(IngestJob.id.not_in(list(skip)))
+        result = await sess.exec(stmt.order_by(IngestJob.id).limit(limit))
+        jobs = result.all()
+    if len(jobs) == limit:
+        next_floor = min(next_floor, jobs[-1].id + 1)
+    return jobs, next_floor
+
+async def get_ingest_job(job_id: int) -> Optional[IngestJob]:
+    async with get_session() as sess:
+        return await sess.get(IngestJob, job_id)
+
+async def list_ingest_jobs(status: Optional[str] = None, limit: int = 50) -> List[IngestJob]:
+    # newest first, without the compiled results
+    stmt = select(IngestJob).options(defer(IngestJob.result))
+    if status:
+        stmt = stmt.where(IngestJob.status == status)
+    async with get_session() as sess:
+        result = await sess.exec(stmt.order_by(IngestJob.id.desc()).limit(limit))
+        return result.all()
 
 # Add more as needed (create_user, verify_user, unlock_song_for_user, etc.)
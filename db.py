@@ -1,20 +1,90 @@
 # db.py
 from sqlmodel import SQLModel, create_engine, Session
 from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import event, inspect, text
 from sqlalchemy.ext.asyncio import create_async_engine
 import os
 from typing import Optional
 
 DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite+aiosqlite:///./sonolus.db")
+SYNC_DATABASE_URL = str(DATABASE_URL).replace("+aiosqlite", "")
 
-engine = create_async_engine(DATABASE_URL, echo=False, future=True)
+# every aiosqlite connection is a thread of its own; with WAL readers run in
+# parallel and writers queue on busy_timeout, so a handful is plenty
+POOL_SIZE = int(os.environ.get("DATABASE_POOL_SIZE", 8))
+MAX_OVERFLOW = int(os.environ.get("DATABASE_MAX_OVERFLOW", 8))
+
+# applied to every new SQLite connection, see configure_sqlite()
+# (config.yml server.sqlite overrides these; an empty value skips a pragma)
+SQLITE_PRAGMAS = {
+    "journal_mode": "wal",  # readers don't block on the writer (and vice versa)
+    "synchronous": "normal",  # safe with WAL, only the last commits can be lost on power loss
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -16000,  # KiB when negative, per connection
+    "busy_timeout": 5000,  # ms a writer waits for the lock instead of failing
+    "temp_store": "memory",
+}
+sqlite_pragmas = dict(SQLITE_PRAGMAS)
+
+_pool_options = {}
+if DATABASE_URL.startswith("sqlite") and ":memory:" not in DATABASE_URL:
+    _pool_options = {"pool_size": POOL_SIZE, "max_overflow": MAX_OVERFLOW}
+
+engine = create_async_engine(DATABASE_URL, echo=False, future=True, **_pool_options)
+# one pooled engine for blocking callers (threads, scripts); creating an
+# engine per call meant a new connection pool for every write
+sync_engine = create_engine(SYNC_DATABASE_URL, future=True, **_pool_options)
+
+def configure_sqlite(options: Optional[dict]):
+    """
+    Overrides pragmas from config (e.g. {"mmap-size": 0}). Only connections
+    opened afterwards are affected, so call it before the first query.
+    """
+    for key, value in (options or {}).items():
+        sqlite_pragmas[key.replace("-", "_")] = value
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma, value in sqlite_pragmas.items():
+        if value is not None and value != "":
+            cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+
+if DATABASE_URL.startswith("sqlite"):
+    event.listen(engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    event.listen(sync_engine, "connect", _apply_sqlite_pragmas)
 
 async def init_db():
     # create tables
     async with engine.begin() as conn:
         await conn.run_sync(SQLModel.metadata.create_all)
+        await conn.run_sync(_dedupe_unlocks)
+        await conn.run_sync(_create_missing_indexes)
+
+def _dedupe_unlocks(conn):
+    # databases from before the unique (user_id, song_id) index can hold
+    # duplicate unlocks, which would make creating it fail; keep the oldest
+    indexes = inspect(conn).get_indexes("userunlock")
+    if any(index["name"] == "ux_userunlock_user_id_song_id" for index in indexes):
+        return
+    conn.execute(
+        text(
+            "DELETE FROM userunlock WHERE id NOT IN "
+            "(SELECT MIN(id) FROM userunlock GROUP BY user_id, song_id)"
+        )
+    )
+
+def _create_missing_indexes(conn):
+    # create_all skips tables that already exist, so indexes added to a
+    # model later would never reach an existing sonolus.db
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+def get_session() -> AsyncSession:
+    # objects stay usable after commit, so handlers can return them
+    return AsyncSession(engine, expire_on_commit=False)
 
 def get_sync_session():
     # utility for blocking tasks that need sync Session
-    sync_engine = create_engine(str(DATABASE_URL).replace("+aiosqlite", ""), future=True)
     return Session(sync_engine)
@@ -1,8 +1,8 @@
-import json, os
+import functools, hashlib, json, os, tempfile, threading, time, traceback
+from concurrent.futures import BrokenExecutor
 from zipfile import ZipFile
-from io import BytesIO
 
-from typing import Optional, List, Union, Dict
+from typing import Optional, List, Union, Dict, Callable, Any, Tuple
 from helpers.datastructs import (
     EngineItem,
     SRL,
@@ -15,10 +15,18 @@ from helpers.datastructs import (
 )
 
 from helpers.repository_map import repo
-from helpers.thumbnail import create_square_thumbnail
-
-import pjsk_background_gen_PIL as pjsk_bg
-from PIL import Image
+from helpers.server_stats import server_stats
+from helpers.sections import level_sections
+from helpers.sha1 import calculate_sha1
+from helpers.executors import executor_pools
+from helpers.metrics import compile_seconds
+from helpers.level_stats import LevelStats
+from helpers.level_assets import (
+    compile_level_stats,
+    generate_preview,
+    hash_zip_members,
+    render_stage_images,
+)
 
 cached = {
     "engines": None,
@@ -31,12 +39,78 @@ cached = {
     "static_levels": [],
 }
 cached_static_level_resource_paths = {}
-if os.path.exists("levels/compiled_static_levels.json"):
-    with open("levels/compiled_static_levels.json", "r", encoding="utf8") as f:
-        static_levels_startup = json.load(f)
-else:
-    static_levels_startup = {"levels": [], "resources": {}}
+cached_static_level_stats: Dict[str, LevelStats] = {}
+# compiled_static_levels.json, loaded by load_static_levels_startup()
+static_levels_startup: Optional[dict] = None
+_static_levels_startup_lock = threading.Lock()
 alr_compiled = set()
+levels_loaded = False
+_levels_loaded_lock = threading.Lock()
+levels_scanned_at: Optional[float] = None
+# held while the level catalog is scanned, compiled into, saved or published
+# into: compile threads would otherwise compile the same level twice, or
+# change the catalog while it's being written out
+_static_levels_lock = threading.Lock()
+# names of levels published from uploads (see publish_dynamic_level)
+dynamic_levels = set()
+
+# how long a level folder scan is trusted before new zips are looked for again
+LEVEL_RESCAN_INTERVAL = 60
+# previews and stage images generated for levels that don't ship them, one
+# folder per level zip. The zips themselves are never written to.
+GENERATED_PATH = os.path.join("levels", ".generated")
+
+def _index_static_levels(levels: List[LevelItem], stats: Dict[str, LevelStats]):
+    engines = {}
+    size = 0
+    for level in levels:
+        engines[level["engine"]["name"]] = engines.get(level["engine"]["name"], 0) + 1
+        size += stats.get(level["name"], {}).get("size", 0)
+        level_sections.add(level)
+    server_stats.set_levels(engines, size)
+
+
+def load_static_levels_startup() -> dict:
+    """
+    Loads the compiled catalog from the last run (once) and indexes it for
+    sections and stats. Not done at import, so importing the app stays
+    cheap: the server starts this in the background on startup, and the
+    first levels compile waits for it if it's still running.
+    """
+    global static_levels_startup
+    with _static_levels_startup_lock:
+        if static_levels_startup is not None:
+            return static_levels_startup
+        if os.path.exists("levels/compiled_static_levels.json"):
+            with open("levels/compiled_static_levels.json", "r", encoding="utf8") as f:
+                startup = json.load(f)
+        else:
+            startup = {"levels": [], "resources": {}, "stats": {}}
+        _index_static_levels(startup["levels"], startup.get("stats", {}))
+        static_levels_startup = startup
+        return startup
+
+def timed_compile(item_type: str):
+    """
+    Records compile durations for `item_type` in the metrics. Calls that
+    are answered from the cache aren't counted.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            lookup = _warm_lookups.get(wrapper)
+            if lookup and lookup() is not None:
+                return func(*args, **kwargs)
+            started_at = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                compile_seconds.observe(time.perf_counter() - started_at, item_type)
+
+        return wrapper
+
+    return decorator
 
 
 def clear_compile_cache(specific: str = None):
@@ -50,20 +124,32 @@ def clear_compile_cache(specific: str = None):
         cached = new_cached.copy()
 
 
+def _file_size(path: str) -> int:
+    if "|" in path:
+        zip_path, member = path.split("|", 1)
+        with ZipFile(zip_path) as zip_file:
+            return zip_file.getinfo(member).file_size
+    return os.path.getsize(path)
+
+
+@timed_compile("banner")
 def compile_banner() -> Optional[SRL]:
     if cached["banner"]:
         return cached["banner"]
     path = "files/banner/banner.png"
     if os.path.exists(path):
         hash = repo.add_file(path)
-        return repo.get_srl(hash)
+        cached["banner"] = repo.get_srl(hash)
+        return cached["banner"]
     return None
 
 
+@timed_compile("posts")
 def compile_static_posts_list(source: str = None) -> List[PostItem]:
     if cached["static_posts"]:
         return cached["static_posts"]
     compiled_data_list = []
+    total_size = 0
     for post in os.listdir("files/posts"):
         if not os.path.isdir(os.path.join("files", "posts", post)):
             continue
@@ -85,8 +171,10 @@ def compile_static_posts_list(source: str = None) -> List[PostItem]:
             )
             if hash:
                 compiled_data[key] = repo.get_srl(hash)
+                total_size += _file_size(f"files/posts/{post}/{file}")
         compiled_data_list.append(compiled_data)
     cached["static_posts"] = compiled_data_list
+    server_stats.set_items("posts", len(compiled_data_list), total_size)
     return compiled_data_list
 
 
@@ -94,14 +182,222 @@ def sort_posts_by_newest(posts: List[PostItem]) -> List[PostItem]:
     return sorted(posts, key=lambda post: post["time"], reverse=True)
 
 
-def compile_static_levels_list(source: str = None) -> List[LevelItem]:
-    global alr_compiled
-    if len(alr_compiled) == 0:
-        cached["static_levels"] = static_levels_startup["levels"]
+def _level_stats_outdated(stats: Optional[LevelStats], level_path: str) -> bool:
+    if not stats or any(key not in stats for key in LevelStats.__annotations__):
+        return True
+    # a level that failed to parse is only retried once its zip changed
+    if stats["failed"]:
+        stat = os.stat(level_path)
+        return (stat.st_size, stat.st_mtime) != (stats["size"], stats["mtime"])
+    return False
+
+
+def static_levels_compiled() -> bool:
+    return levels_scanned_at is not None
+
+
+def _load_compiled_levels():
+    """Seeds the level caches from compiled_static_levels.json, once."""
+    global alr_compiled, cached_static_level_resource_paths, cached_static_level_stats
+    global levels_loaded
+    with _levels_loaded_lock:
+        if levels_loaded:
+            return
+        startup = load_static_levels_startup()
+        cached["static_levels"] = startup["levels"]
         alr_compiled = set([item["name"] for item in cached["static_levels"]])
-        cached_static_level_resource_paths = static_levels_startup["resources"]
+        cached_static_level_resource_paths = startup["resources"]
+        cached_static_level_stats = startup.get("stats", {})
         for hash, file_path in cached_static_level_resource_paths.items():
-            repo._map[hash] = {"hash": hash, "file": file_path}
+            repo.register(hash, file_path)
+        levels_loaded = True
+
+
+def _generated_path(level_path: str, filename: str) -> str:
+    key = hashlib.sha1(os.path.abspath(level_path).encode()).hexdigest()
+    return os.path.join(GENERATED_PATH, key, filename)
+
+
+def _load_generated(level_path: str, filename: str) -> Optional[str]:
+    """`filename` generated for this zip before, unless the zip changed since."""
+    path = _generated_path(level_path, filename)
+    try:
+        if os.path.getmtime(path) >= os.path.getmtime(level_path):
+            return path
+    except FileNotFoundError:
+        pass
+    return None
+
+
+def _save_generated(level_path: str, filename: str, data: bytes) -> str:
+    path = _generated_path(level_path, filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # written aside and renamed, so a reader never sees half a file
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as f:
+        f.write(data)
+    try:
+        os.replace(f.name, path)
+    except OSError:
+        os.remove(f.name)
+        raise
+    return path
+
+
+def compile_level(
+    level_path: str, levelname: str, engine_data: EngineItem, source: str = None
+) -> Tuple[LevelItem, LevelStats, Dict[str, str]]:
+    """
+    Compiles one level zip into a LevelItem: hashes its files, computes its
+    stats and generates a missing preview/stage (into GENERATED_PATH).
+    Resources are added to the repository; returns (level, stats,
+    resources), resources being hash -> "zip|member" (or the generated
+    file's path). Raises ValueError for zips that lack level files. Blocks
+    on the cpu/render pools, so run it on a compile thread.
+    """
+    compiled_data: LevelItem = {
+        "name": levelname,
+        "tags": [{"title": f"Engine: {engine_data['name']}", "icon": "engine"}],
+        "useSkin": {"useDefault": True},
+        "useEffect": {"useDefault": True},
+        "useParticle": {"useDefault": True},
+        "useBackground": {"useDefault": True},
+        "engine": engine_data,
+    }
+    if source:
+        compiled_data["source"] = source
+    with ZipFile(level_path, "r") as zip_file:
+        with zip_file.open("level.json") as f:
+            level_data = json.load(f)
+        names = set(zip_file.namelist())
+    item_keys = [
+        "version",
+        "title",
+        "rating",
+        "author",
+        "artists",
+    ]
+    for key in item_keys:
+        compiled_data[key] = level_data[key]
+    if level_data.get("description"):
+        compiled_data["description"] = level_data["description"]
+    data_files = {
+        "cover": "jacket.png",
+        "data": "level.data",
+        "bgm": "music.mp3",
+        "preview": "music_pre.mp3",
+    }
+    missing = [
+        filename
+        for key, filename in data_files.items()
+        if key != "preview" and filename not in names
+    ]
+    if missing:
+        raise ValueError(f"{level_path} is missing {', '.join(missing)}")
+    # filename -> path of files generated for this zip by an earlier compile
+    generated: Dict[str, str] = {}
+    for filename in ["music_pre.mp3", "stage.png", "stage_thumbnail.png"]:
+        if filename not in names and (path := _load_generated(level_path, filename)):
+            generated[filename] = path
+    # a generated stage is only reused along with its thumbnail
+    make_stage = (
+        "stage.png" not in names
+        and not level_data.get("no_custom_stage")
+        and not ("stage.png" in generated and "stage_thumbnail.png" in generated)
+    )
+    make_thumbnail = "stage_thumbnail.png" not in names and (
+        make_stage or ("stage.png" in names and "stage_thumbnail.png" not in generated)
+    )
+    if make_stage:
+        generated.pop("stage.png", None)
+    if make_thumbnail:
+        generated.pop("stage_thumbnail.png", None)
+
+    # hashing, stats, preview cuts and renders only read the
+    # zip, so they all go to the process pools at once
+    members = [
+        filename
+        for filename in [*data_files.values(), "stage.png", "stage_thumbnail.png"]
+        if filename in names
+    ]
+    hashes_job = executor_pools.submit("cpu", hash_zip_members, level_path, members)
+    stats_job = executor_pools.submit("cpu", compile_level_stats, level_path)
+    preview_job = None
+    if "music_pre.mp3" not in names and "music_pre.mp3" not in generated:
+        preview_job = executor_pools.submit("cpu", generate_preview, level_path)
+    render_job = None
+    if make_stage or make_thumbnail:
+        render_job = executor_pools.submit(
+            "render", render_stage_images, level_path, make_stage, make_thumbnail
+        )
+    hashes = hashes_job.result()
+    stats = stats_job.result()
+    for filename, path in generated.items():
+        hashes[filename] = calculate_sha1(path)
+    new_files: Dict[str, bytes] = {}
+    if preview_job and (preview_bytes := preview_job.result()):
+        new_files["music_pre.mp3"] = preview_bytes
+    if render_job:
+        stage_bytes, tn_bytes = render_job.result()
+        if stage_bytes:
+            new_files["stage.png"] = stage_bytes
+        if tn_bytes:
+            new_files["stage_thumbnail.png"] = tn_bytes
+    for filename, data in new_files.items():
+        generated[filename] = _save_generated(level_path, filename, data)
+        hashes[filename] = calculate_sha1(data)
+
+    level_path = level_path.replace("\\", "/")
+    resources: Dict[str, str] = {}
+
+    def add_resource(filename: str) -> SRL:
+        if filename in generated:
+            path = generated[filename].replace("\\", "/")
+        else:
+            path = f"{level_path}|{filename}"
+        hash = repo.add_file_hash(path, hashes[filename])
+        resources[hash] = path
+        return repo.get_srl(hash)
+
+    for key, filename in data_files.items():
+        if filename in hashes:
+            compiled_data[key] = add_resource(filename)
+    if "stage.png" in hashes:
+        image = add_resource("stage.png")
+        thumbnail = add_resource("stage_thumbnail.png")
+        compiled_data["useBackground"]["useDefault"] = False
+        stage_item: BackgroundItem = {
+            "name": f"levelbg-{levelname}",
+            "version": 2,
+            "tags": [],
+            "title": level_data["title"],
+            "subtitle": "UntitledCharts Background",
+            "author": "YumYummity",
+            "thumbnail": thumbnail,
+            "data": engine_data["background"]["data"],
+            "image": image,
+            "configuration": engine_data["background"]["configuration"],
+        }
+        compiled_data["useBackground"]["item"] = stage_item
+    return compiled_data, stats, resources
+
+
+@timed_compile("levels")
+def compile_static_levels_list(source: str = None) -> List[LevelItem]:
+    """
+    Compiles level zips that aren't in the catalog yet and saves the catalog
+    to compiled_static_levels.json. Scans run one at a time: a call that had
+    to wait for another scan returns that scan's list.
+    """
+    scanned_at = levels_scanned_at
+    with _static_levels_lock:
+        if levels_scanned_at is not None and levels_scanned_at != scanned_at:
+            return cached["static_levels"]
+        return _scan_static_levels(source)
+
+
+def _scan_static_levels(source: str = None) -> List[LevelItem]:
+    global levels_scanned_at
+    _load_compiled_levels()
 
     levels_root = "levels"
     engines = compile_engines_list(source)
@@ -119,134 +415,130 @@ def compile_static_levels_list(source: str = None) -> List[LevelItem]:
                     continue
                 for level_file in os.listdir(engine_path):
                     try:
-                        invalid_chart_flag = False
                         if not level_file.endswith(".zip"):
                             continue
                         level_path = os.path.join(engine_path, level_file)
                         levelname = os.path.splitext(level_file)[0]
                         if levelname in alr_compiled:
-                            continue
-                        # iterate all files, {levelname}.zip
-                        compiled_data: LevelItem = {
-                            "name": levelname,
-                            "tags": [
-                                {"title": f"Engine: {engine_name}", "icon": "engine"}
-                            ],
-                            "useSkin": {"useDefault": True},
-                            "useEffect": {"useDefault": True},
-                            "useParticle": {"useDefault": True},
-                            "useBackground": {"useDefault": True},
-                            "engine": engine_data,
-                        }
-                        if source:
-                            compiled_data["source"] = source
-                        with ZipFile(level_path, "a") as zip_file:
-                            with zip_file.open("level.json") as f:
-                                level_data = json.load(f)
-                            item_keys = [
-                                "version",
-                                "title",
-                                "rating",
-                                "author",
-                                "artists",
-                            ]
-                            for key in item_keys:
-                                compiled_data[key] = level_data[key]
-                            if level_data.get("description"):
-                                compiled_data["description"] = level_data["description"]
-                            data_files = {
-                                "cover": "jacket.png",
-                                "data": "level.data",
-                                "bgm": "music.mp3",
-                                "preview": "music_pre.mp3",
-                            }
-                            for key, filename in data_files.items():
-                                if filename in zip_file.namelist():
-                                    hash = repo.add_file(f"{level_path}|{filename}")
-                                    if hash:
-                                        compiled_data[key] = repo.get_srl(hash)
-                                        level_path = level_path.replace("\\", "/")
-                                        cached_static_level_resource_paths[hash] = (
-                                            f"{level_path}|{filename}"
-                                        )
-                                else:
-                                    if key == "preview":
-                                        pass
-                                    else:
-                                        invalid_chart_flag = True
-                                        break
-                            if invalid_chart_flag:
-                                continue
-                            if not "stage.png" in zip_file.namelist():
-                                if level_data.get("no_custom_stage"):
-                                    pass
-                                else:
-                                    jacket = Image.open(
-                                        BytesIO(zip_file.read("jacket.png"))
+                            # backfill stats for catalogs compiled before stats existed
+                            if _level_stats_outdated(
+                                cached_static_level_stats.get(levelname), level_path
+                            ):
+                                cached_static_level_stats[levelname] = (
+                                    executor_pools.call(
+                                        "cpu", compile_level_stats, level_path
                                     )
-                                    bg = pjsk_bg.render_v3(jacket)
-                                    buf = BytesIO()
-                                    bg.save(buf, format="PNG")
-                                    stage_bytes = buf.getvalue()
-                                    zip_file.writestr("stage.png", stage_bytes)
-                            if "stage.png" in zip_file.namelist():
-                                hash = repo.add_file(f"{level_path}|stage.png")
-                                image = repo.get_srl(hash)
-                                level_path = level_path.replace("\\", "/")
-                                cached_static_level_resource_paths[hash] = (
-                                    f"{level_path}|stage.png"
-                                )
-                                if "stage_thumbnail.png" not in zip_file.namelist():
-                                    bg = Image.open(BytesIO(zip_file.read("stage.png")))
-                                    tn = create_square_thumbnail(bg)
-                                    buf = BytesIO()
-                                    tn.save(buf, format="PNG")
-                                    tn_bytes = buf.getvalue()
-                                    zip_file.writestr("stage_thumbnail.png", tn_bytes)
-                                hash2 = repo.add_file(
-                                    f"{level_path}|stage_thumbnail.png"
                                 )
-                                thumbnail = repo.get_srl(hash2)
-                                level_path = level_path.replace("\\", "/")
-                                cached_static_level_resource_paths[hash2] = (
-                                    f"{level_path}|stage_thumbnail.png"
-                                )
-                                compiled_data["useBackground"]["useDefault"] = False
-                                stage_item: BackgroundItem = {
-                                    "name": f"levelbg-{levelname}",
-                                    "version": 2,
-                                    "tags": [],
-                                    "title": level_data["title"],
-                                    "subtitle": "UntitledCharts Background",
-                                    "author": "YumYummity",
-                                    "thumbnail": thumbnail,
-                                    "data": engine_data["background"]["data"],
-                                    "image": image,
-                                    "configuration": engine_data["background"][
-                                        "configuration"
-                                    ],
-                                }
-                                compiled_data["useBackground"]["item"] = stage_item
-                    except Exception as e:
+                                modified = True
+                            continue
+                        compiled_data, stats, resources = compile_level(
+                            level_path, levelname, engine_data, source
+                        )
+                        cached_static_level_stats[levelname] = stats
+                        cached_static_level_resource_paths.update(resources)
+                    except BrokenExecutor:
+                        # a dead cpu/render pool fails every level after it
+                        raise
+                    except Exception:
+                        print(f"[WARN] Skipping level {level_path}:")
+                        traceback.print_exc()
                         continue
                     modified = True
+                    alr_compiled.add(levelname)
                     cached["static_levels"].append(compiled_data)
+                    server_stats.add_level(
+                        engine_name,
+                        cached_static_level_stats.get(levelname, {}).get("size", 0),
+                    )
+                    level_sections.add(compiled_data)
     if modified:
+        # uploads are republished from the database instead
         with open("levels/compiled_static_levels.json", "w", encoding="utf8") as f:
             json.dump(
                 {
-                    "levels": cached["static_levels"],
+                    "levels": [
+                        level
+                        for level in cached["static_levels"]
+                        if level["name"] not in dynamic_levels
+                    ],
                     "resources": cached_static_level_resource_paths,
+                    "stats": {
+                        name: stats
+                        for name, stats in cached_static_level_stats.items()
+                        if name not in dynamic_levels
+                    },
                 },
                 f,
             )
+    levels_scanned_at = time.monotonic()
     return cached["static_levels"]
 
 
+@timed_compile("uploads")
+def compile_dynamic_level(
+    level_path: str, levelname: str, default_engine: str, source: str = None
+) -> dict:
+    """
+    compile_level for an uploaded chart, whose engine comes from level.json's
+    "engine" (default_engine if it has none). Returns what
+    publish_dynamic_levels takes, JSON-serializable so it can be stored:
+    the level (its engine replaced by the engine's name), stats and resources.
+    """
+    with ZipFile(level_path) as zip_file:
+        with zip_file.open("level.json") as f:
+            engine_name = json.load(f).get("engine")
+    if not isinstance(engine_name, str):
+        engine_name = default_engine
+    engine_data = next(
+        (e for e in compile_engines_list(source) if e["name"] == engine_name), None
+    )
+    if not engine_data:
+        raise ValueError(f'Unknown engine "{engine_name}"')
+    level, stats, resources = compile_level(level_path, levelname, engine_data, source)
+    return {
+        "level": {**level, "engine": engine_name},
+        "stats": stats,
+        "resources": resources,
+    }
+
+
+def publish_dynamic_levels(compiled: List[dict], source: str = None) -> int:
+    """
+    Adds levels from compile_dynamic_level to the live catalog, its sections
+    and stats without recompiling anything. Levels already in the catalog
+    (or whose engine is gone) are skipped. Returns how many were added.
+    """
+    with _static_levels_lock:
+        _load_compiled_levels()
+        engines = {engine["name"]: engine for engine in compile_engines_list(source)}
+        added = 0
+        for item in compiled:
+            level = item["level"]
+            engine_data = engines.get(level["engine"])
+            if level["name"] in alr_compiled or not engine_data:
+                continue
+            for hash, file_path in item["resources"].items():
+                repo.register(hash, file_path)
+            level = {**level, "engine": engine_data}
+            if item["stats"]:
+                cached_static_level_stats[level["name"]] = item["stats"]
+            dynamic_levels.add(level["name"])
+            alr_compiled.add(level["name"])
+            cached["static_levels"].append(level)
+            server_stats.add_level(
+                engine_data["name"], (item["stats"] or {}).get("size", 0)
+            )
+            level_sections.add(level)
+            added += 1
+        return added
+
+
+@timed_compile("effects")
 def compile_effects_list(source: str = None) -> List[EffectItem]:
     if cached["effects"]:
         return cached["effects"]
     compiled_data_list = []
+    total_size = 0
     for effect in os.listdir("files/effects"):
         if not os.path.isdir(os.path.join("files", "effects", effect)):
             continue
@@ -265,15 +557,19 @@ def compile_effects_list(source: str = None) -> List[EffectItem]:
         for key, file in data_files.items():
             hash = repo.add_file(f"files/effects/{effect}/{file}")
             compiled_data[key] = repo.get_srl(hash)
+            total_size += _file_size(f"files/effects/{effect}/{file}")
         compiled_data_list.append(compiled_data)
     cached["effects"] = compiled_data_list
+    server_stats.set_items("effects", len(compiled_data_list), total_size)
     return compiled_data_list
 
 
+@timed_compile("backgrounds")
 def compile_backgrounds_list(source: str = None) -> List[BackgroundItem]:
     if cached["backgrounds"]:
         return cached["backgrounds"]
     compiled_data_list = []
+    total_size = 0
     for background in os.listdir("files/backgrounds"):
         if not os.path.isdir(os.path.join("files", "backgrounds", background)):
             continue
@@ -299,15 +595,19 @@ def compile_backgrounds_list(source: str = None) -> List[BackgroundItem]:
         for key, file in data_files.items():
             hash = repo.add_file(f"files/backgrounds/{background}/{file}")
             compiled_data[key] = repo.get_srl(hash)
+            total_size += _file_size(f"files/backgrounds/{background}/{file}")
         compiled_data_list.append(compiled_data)
     cached["backgrounds"] = compiled_data_list
+    server_stats.set_items("backgrounds", len(compiled_data_list), total_size)
     return compiled_data_list
 
 
+@timed_compile("particles")
 def compile_particles_list(source: str = None) -> List[ParticleItem]:
     if cached["particles"]:
         return cached["particles"]
     compiled_data_list = []
+    total_size = 0
     for particle in os.listdir("files/particles"):
         if not os.path.isdir(os.path.join("files", "particles", particle)):
             continue
@@ -332,15 +632,19 @@ def compile_particles_list(source: str = None) -> List[ParticleItem]:
         for key, file in data_files.items():
             hash = repo.add_file(f"files/particles/{particle}/{file}")
             compiled_data[key] = repo.get_srl(hash)
+            total_size += _file_size(f"files/particles/{particle}/{file}")
         compiled_data_list.append(compiled_data)
     cached["particles"] = compiled_data_list
+    server_stats.set_items("particles", len(compiled_data_list), total_size)
     return compiled_data_list
 
 
+@timed_compile("skins")
 def compile_skins_list(source: str = None) -> List[SkinItem]:
     if cached["skins"]:
         return cached["skins"]
     compiled_data_list = []
+    total_size = 0
     for skin in os.listdir("files/skins"):
         if not os.path.isdir(os.path.join("files", "skins", skin)):
             continue
@@ -363,15 +667,19 @@ def compile_skins_list(source: str = None) -> List[SkinItem]:
         for key, file in data_files.items():
             hash = repo.add_file(f"files/skins/{skin}/{file}")
             compiled_data[key] = repo.get_srl(hash)
+            total_size += _file_size(f"files/skins/{skin}/{file}")
         compiled_data_list.append(compiled_data)
     cached["skins"] = compiled_data_list
+    server_stats.set_items("skins", len(compiled_data_list), total_size)
     return compiled_data_list
 
 
+@timed_compile("engines")
 def compile_engines_list(source: str = None) -> List[EngineItem]:
     if cached["engines"]:
         return cached["engines"]
     compiled_data_list = []
+    total_size = 0
     for engine in os.listdir("files/engines"):
         if not os.path.isdir(os.path.join("files", "engines", engine)):
             continue
@@ -405,6 +713,7 @@ def compile_engines_list(source: str = None) -> List[EngineItem]:
         for key, file in data_files.items():
             hash = repo.add_file(f"files/engines/{engine}/{file}")
             compiled_data[key] = repo.get_srl(hash)
+            total_size += _file_size(f"files/engines/{engine}/{file}")
         skins = compile_skins_list(source)
         skin_data = next(
             skin for skin in skins if skin["name"] == engine_data["skin_name"]
@@ -431,4 +740,58 @@ def compile_engines_list(source: str = None) -> List[EngineItem]:
         compiled_data["background"] = background_data
         compiled_data_list.append(compiled_data)
     cached["engines"] = compiled_data_list
+    server_stats.set_items("engines", len(compiled_data_list), total_size)
     return compiled_data_list
+
+
+def _warm_static_levels(source: str = None) -> Optional[List[LevelItem]]:
+    """
+    The level list once it's been scanned. Past LEVEL_RESCAN_INTERVAL it's
+    still served as is, while one rescan (started here, on the compile pool)
+    looks for new zips in the background.
+    """
+    global levels_scanned_at
+    if levels_scanned_at is None:
+        return None
+    if time.monotonic() - levels_scanned_at > LEVEL_RESCAN_INTERVAL:
+        if not executor_pools.started:
+            # nothing to rescan on in the background: compile in the caller
+            return None
+        # moved before the rescan starts, so requests until it's done don't
+        # start one of their own
+        levels_scanned_at = time.monotonic()
+        executor_pools.submit(
+            "compile", compile_static_levels_list, source
+        ).add_done_callback(_report_rescan)
+    return cached["static_levels"]
+
+
+def _report_rescan(future):
+    if not future.cancelled() and future.exception():
+        print("[WARN] Background level rescan failed:")
+        traceback.print_exception(future.exception())
+
+
+_warm_lookups: Dict[Callable, Callable[[], Any]] = {
+    compile_banner: lambda: cached["banner"],
+    compile_static_posts_list: lambda: cached["static_posts"],
+    compile_effects_list: lambda: cached["effects"],
+    compile_backgrounds_list: lambda: cached["backgrounds"],
+    compile_particles_list: lambda: cached["particles"],
+    compile_skins_list: lambda: cached["skins"],
+    compile_engines_list: lambda: cached["engines"],
+}
+
+
+def get_warm(func: Callable, *args) -> Optional[Any]:
+    """
+    Returns what `func(*args)` would return if it's already compiled, without
+    doing any work. Cheap enough to call on the event loop. The level list
+    is returned even if it's due for a rescan (see _warm_static_levels).
+    """
+    if func is compile_static_levels_list:
+        return _warm_static_levels(*args)
+    lookup = _warm_lookups.get(func)
+    if lookup:
+        return lookup()
+    return None
@@ -522,6 +522,13 @@ class ServerItemInfo(TypedDict):
     banner: Optional[SRL]
 
 
+class ServerItemList(TypedDict):
+    pageCount: int
+    cursor: Optional[str]
+    items: List[T]
+    searches: Optional[List[ServerForm]]
+
+
 # endregion
 
 
@@ -0,0 +1,204 @@
+import asyncio, multiprocessing, os, threading, time
+
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+# name -> pool settings, used when config.yml has no server.executors section
+DEFAULT_POOLS = {
+    "io": {"kind": "thread", "workers": 16, "queue": 256},
+    "compile": {"kind": "thread", "workers": 4, "queue": 32, "retry-after": 2},
+    "cpu": {"kind": "process", "workers": 2, "queue": 64, "retry-after": 2},
+    "render": {"kind": "process", "workers": 1, "queue": 16, "retry-after": 5},
+    "auth": {"kind": "process", "workers": 2, "queue": 32, "status": 429},
+}
+
+
+class ExecutorSaturated(Exception):
+    def __init__(self, name: str, retry_after: int, status: int = 503):
+        super().__init__(f'Executor "{name}" is saturated')
+        self.name = name
+        self.retry_after = retry_after
+        self.status = status
+
+
+class ExecutorPools:
+    """
+    Named executors ("thread" or "process" kind), created on first use.
+
+    Until start() is called every submit runs inline in the calling thread,
+    so scripts and the pre-fork catalog preload never spin up pools that
+    forked workers would inherit half-broken. Pools remember the pid that
+    made them and are rebuilt if used from another process.
+
+    Functions sent to a process pool must be importable top-level functions
+    that don't rely on in-process state (see helpers.level_assets).
+    """
+
+    def __init__(self, config: Optional[dict] = None):
+        self.config = config or DEFAULT_POOLS
+        self.started = False
+        self._pools: Dict[str, Executor] = {}
+        self._pid: Optional[int] = None
+        # compile threads ask for the cpu/render pools at the same time
+        self._lock = threading.Lock()
+
+    def configure(self, config: Optional[dict]):
+        self.config = config or DEFAULT_POOLS
+
+    def start(self):
+        self.started = True
+
+    def options(self, name: str) -> dict:
+        return self.config.get(name) or {}
+
+    def workers(self, name: str) -> int:
+        return self.options(name).get("workers", 1)
+
+    def get(self, name: str) -> Executor:
+        if self._pid == os.getpid() and (pool := self._pools.get(name)):
+            return pool
+        with self._lock:
+            return self._create(name)
+
+    def _create(self, name: str) -> Executor:
+        if self._pid != os.getpid():
+            self._pools = {}
+            self._pid = os.getpid()
+        pool = self._pools.get(name)
+        if pool is None:
+            if self.options(name).get("kind", "thread") == "process":
+                # never fork a process that's already running the event loop
+                # and other pools' threads
+                method = (
+                    "forkserver"
+                    if "forkserver" in multiprocessing.get_all_start_methods()
+                    else "spawn"
+                )
+                pool = ProcessPoolExecutor(
+                    max_workers=self.workers(name),
+                    mp_context=multiprocessing.get_context(method),
+                )
+            else:
+                pool = ThreadPoolExecutor(
+                    max_workers=self.workers(name), thread_name_prefix=name
+                )
+            self._pools[name] = pool
+        return pool
+
+    def submit(self, name: str, func: Callable, *args) -> Future:
+        """
+        For use from blocking code (compile threads): hand func to the
+        `name` pool, or run it right here if pools aren't started.
+        """
+        if self.started:
+            return self.get(name).submit(func, *args)
+        future = Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def call(self, name: str, func: Callable, *args):
+        return self.submit(name, func, *args).result()
+
+    def shutdown(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                for pool in self._pools.values():
+                    pool.shutdown(wait=False, cancel_futures=True)
+            self._pools = {}
+
+
+executor_pools = ExecutorPools()
+
+
+class BoundedExecutor:
+    """
+    Admission control in front of a named pool: at most `workers` jobs run
+    and `max_queue` more may wait; anything past that is rejected right away
+    with ExecutorSaturated instead of piling up behind everyone else.
+
+    Counters are only touched from the event loop, so they need no locking.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        pools: ExecutorPools,
+        workers: int,
+        max_queue: int,
+        retry_after: int = 1,
+        status: int = 503,
+    ):
+        self.name = name
+        self.pools = pools
+        self.workers = workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.status = status  # HTTP status when saturated
+
+        self.pending = 0  # running + queued
+        self.submitted = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    @property
+    def queued(self) -> int:
+        return max(0, self.pending - self.workers)
+
+    async def run(self, func: Callable, *args):
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise ExecutorSaturated(self.name, self.retry_after, self.status)
+        self.pending += 1
+        self.submitted += 1
+        queued_at = time.perf_counter()
+        try:
+            # perf_counter is system-wide, so process pool timestamps compare
+            started_at, result = await asyncio.get_running_loop().run_in_executor(
+                self.pools.get(self.name), _timed_call, func, *args
+            )
+        finally:
+            self.pending -= 1
+        wait = started_at - queued_at
+        self.wait_seconds_total += wait
+        self.wait_seconds_max = max(self.wait_seconds_max, wait)
+        return result
+
+    def snapshot(self) -> dict:
+        """Current state for /metrics (see EXECUTOR_METRICS in app.py)."""
+        return {
+            "pending": self.pending,
+            "queued": self.queued,
+            "running": self.pending - self.queued,
+            "workers": self.workers,
+            "maxQueue": self.max_queue,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "waitSecondsTotal": self.wait_seconds_total,
+            "waitSecondsMax": self.wait_seconds_max,
+        }
+
+
+def _timed_call(func: Callable, *args):
+    return time.perf_counter(), func(*args)
+
+
+def create_bounded_executors(pools: ExecutorPools) -> Dict[str, BoundedExecutor]:
+    """
+    One BoundedExecutor per configured pool, e.g.
+    {"io": {"kind": "thread", "workers": 16, "queue": 256}, ...}
+    """
+    return {
+        name: BoundedExecutor(
+            name,
+            pools,
+            pools.workers(name),
+            max_queue=pools.options(name).get("queue", 64),
+            retry_after=pools.options(name).get("retry-after", 1),
+            status=pools.options(name).get("status", 503),
+        )
+        for name in pools.config
+    }
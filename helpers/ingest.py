@@ -0,0 +1,110 @@
+"""
+Ingest queue for uploaded charts: compiles them into the Sonolus catalog.
+
+Uploads get an IngestJob row in sonolus.db, so the queue survives
+restarts. Every worker process runs an IngestWorker, which:
+- claims queued jobs one at a time and compiles each on the compile pool
+  (hashing, stats, preview and stage renders, see compile_dynamic_level),
+  storing the compiled level on the job. A job whose worker died is
+  claimed again once its LEASE_SECONDS are up.
+- publishes every job finished since its last look, by any worker, into
+  its own catalog (publish_dynamic_levels): nothing is recompiled, so in
+  multi-worker mode one compile serves all workers, and on startup the
+  whole queue is republished from the database.
+
+Jobs are looked for every POLL_INTERVAL seconds, and right away after an
+upload to this worker (wake()).
+"""
+
+import asyncio, json, traceback
+
+from typing import List, Optional, Set
+
+import crud
+from helpers.data_compilers import compile_dynamic_level, publish_dynamic_levels
+from helpers.executors import ExecutorSaturated
+from helpers.metrics import ingest_jobs
+
+POLL_INTERVAL = 2
+# a job still running after this long lost its worker and is claimed again
+LEASE_SECONDS = 600
+MAX_ATTEMPTS = 3
+
+
+def _compile(path: str, name: str, default_engine: str, source: str) -> str:
+    return json.dumps(compile_dynamic_level(path, name, default_engine, source))
+
+
+def _publish(results: List[str], source: str) -> int:
+    return publish_dynamic_levels([json.loads(result) for result in results], source)
+
+
+class IngestWorker:
+    def __init__(self, default_engine: Optional[str], poll_interval: float = POLL_INTERVAL):
+        # for charts whose level.json doesn't name an engine
+        self.default_engine = default_engine
+        self.poll_interval = poll_interval
+        self._wake = asyncio.Event()
+        # jobs below _floor are all published (or failed); _published
+        # holds the ones at or above it that are
+        self._floor = 0
+        self._published: Set[int] = set()
+
+    def wake(self):
+        self._wake.set()
+
+    async def run(self, app):
+        try:
+            await crud.enqueue_missing_ingest_jobs()
+        except Exception:
+            traceback.print_exc()
+        while True:
+            try:
+                await self.publish_finished(app)
+                while await self.process_one(app):
+                    await self.publish_finished(app)
+            except Exception:
+                traceback.print_exc()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def process_one(self, app) -> bool:
+        """Compiles the next queued job, if any. False if there was none."""
+        job = await crud.claim_ingest_job(LEASE_SECONDS, MAX_ATTEMPTS)
+        if job is None:
+            return False
+        try:
+            result = await app.run_blocking(
+                _compile, job.path, job.song_id, self.default_engine, app.base_url,
+                pool="compile",
+            )
+        except ExecutorSaturated as e:
+            await crud.release_ingest_job(job.id)
+            await asyncio.sleep(e.retry_after)
+            return False
+        except Exception as e:
+            # compiles are deterministic, so a broken chart isn't retried
+            await crud.finish_ingest_job(job.id, error=f"{type(e).__name__}: {e}")
+            ingest_jobs.inc("failed")
+            return True
+        await crud.finish_ingest_job(job.id, result=result)
+        ingest_jobs.inc("done")
+        return True
+
+    async def publish_finished(self, app) -> int:
+        """Adds jobs finished since the last call to the catalog; returns how many."""
+        added = 0
+        while True:
+            jobs, floor = await crud.finished_ingest_jobs(self._floor, self._published)
+            if jobs:
+                added += await app.run_blocking(
+                    _publish, [job.result for job in jobs], app.base_url, pool="compile"
+                )
+                self._published.update(job.id for job in jobs)
+            self._floor = floor
+            self._published = {id for id in self._published if id >= floor}
+            if len(jobs) < crud.BULK_CHUNK:
+                return added
@@ -0,0 +1,112 @@
+"""
+Per-level work that only needs the level zip on disk: hashing, stats,
+preview cuts and stage renders. Nothing here touches the compile caches
+or the repository, so these run in the cpu/render process pools
+(helpers.executors.executor_pools) and must stay cheap to import.
+"""
+
+import hashlib, os
+from io import BytesIO
+from zipfile import ZipFile
+
+from typing import Dict, List, Optional, Tuple
+
+from helpers.level_stats import LevelStats, empty_level_stats, extract_level_stats
+from helpers.mp3_info import read_mp3_info, slice_mp3
+
+# generated previews: PREVIEW_SECONDS long, starting PREVIEW_START into the song
+PREVIEW_SECONDS = 20
+PREVIEW_MIN_SECONDS = 15
+PREVIEW_START = 0.3
+
+
+def hash_zip_members(zip_path: str, names: List[str]) -> Dict[str, str]:
+    """
+    sha1 of each member, streamed so only a small buffer crosses the
+    process boundary instead of the file contents.
+    """
+    hashes = {}
+    with ZipFile(zip_path) as zip_file:
+        for name in names:
+            sha1 = hashlib.sha1()
+            with zip_file.open(name) as f:
+                while chunk := f.read(1024 * 1024):
+                    sha1.update(chunk)
+            hashes[name] = sha1.hexdigest()
+    return hashes
+
+
+def compile_level_stats(zip_path: str) -> LevelStats:
+    """
+    level.data and music.mp3 are read independently: a part that can't be
+    read is left empty and listed in "failed", and "size"/"mtime" tell the
+    compiler whether the zip changed since (and is worth another try).
+    """
+    stat = os.stat(zip_path)
+    stats = empty_level_stats()
+    try:
+        with ZipFile(zip_path) as zip_file:
+            try:
+                with zip_file.open("level.data") as f:
+                    stats = extract_level_stats(f)
+            except Exception:
+                stats["failed"].append("data")
+            try:
+                music_info = zip_file.getinfo("music.mp3")
+                with zip_file.open(music_info) as f:
+                    stats["music"] = read_mp3_info(f, music_info.file_size)
+            except Exception:
+                pass
+            if stats["music"] is None:
+                stats["failed"].append("music")
+    except Exception:
+        stats["failed"] = ["data", "music"]
+    stats["size"] = stat.st_size
+    stats["mtime"] = stat.st_mtime
+    return stats
+
+
+def generate_preview(zip_path: str) -> Optional[bytes]:
+    """
+    Cuts a preview clip out of music.mp3 for levels that don't ship
+    music_pre.mp3. Frames are copied as-is, nothing is re-encoded.
+    """
+    try:
+        with ZipFile(zip_path) as zip_file:
+            data = zip_file.read("music.mp3")
+        info = read_mp3_info(BytesIO(data), len(data))
+    except Exception:
+        return None
+    if not info or info["duration"] < PREVIEW_MIN_SECONDS:
+        return None
+    length = min(PREVIEW_SECONDS, info["duration"])
+    start = min(info["duration"] * PREVIEW_START, info["duration"] - length)
+    return slice_mp3(data, start, length)
+
+
+def render_stage_images(
+    zip_path: str, stage: bool, thumbnail: bool
+) -> Tuple[Optional[bytes], Optional[bytes]]:
+    """
+    PNG bytes of (stage.png rendered from jacket.png, stage_thumbnail.png),
+    each only if asked for. The thumbnail is cut from the new stage if one
+    was rendered, otherwise from the stage.png already in the zip.
+    """
+    # PIL and the background generator are only needed in the render pool
+    import pjsk_background_gen_PIL as pjsk_bg
+    from PIL import Image
+    from helpers.thumbnail import create_square_thumbnail
+
+    stage_bytes = thumbnail_bytes = None
+    with ZipFile(zip_path) as zip_file:
+        if stage:
+            jacket = Image.open(BytesIO(zip_file.read("jacket.png")))
+            buf = BytesIO()
+            pjsk_bg.render_v3(jacket).save(buf, format="PNG")
+            stage_bytes = buf.getvalue()
+        if thumbnail:
+            bg = Image.open(BytesIO(stage_bytes or zip_file.read("stage.png")))
+            buf = BytesIO()
+            create_square_thumbnail(bg).save(buf, format="PNG")
+            thumbnail_bytes = buf.getvalue()
+    return stage_bytes, thumbnail_bytes
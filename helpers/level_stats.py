@@ -0,0 +1,232 @@
+import gzip, io, json
+
+from typing import IO, Dict, Iterator, List, Optional, Tuple, TypedDict
+
+from helpers.mp3_info import Mp3Info
+
+# archetypes ending in "Note" are notes, except engine helpers that never get judged
+_NON_NOTE_PREFIXES = ("Ignored", "Hidden")
+_BPM_CHANGE_ARCHETYPE = "#BPM_CHANGE"
+_DEFAULT_BPM = 60.0
+_CHUNK_SIZE = 64 * 1024
+_DELIMITERS = ",]} \t\r\n"
+
+
+class LevelStats(TypedDict):
+    entities: int
+    notes: int
+    archetypes: Dict[str, int]
+    bgmOffset: float
+    bpmChanges: List[Tuple[float, float]]
+    firstNoteBeat: Optional[float]
+    lastNoteBeat: Optional[float]
+    firstNoteTime: Optional[float]
+    lastNoteTime: Optional[float]
+    # filled in by the level compiler
+    music: Optional[Mp3Info]
+    size: int  # bytes of the level archive
+    mtime: float  # of the level archive, when these were computed
+    failed: List[str]  # parts that couldn't be read: "data" and/or "music"
+
+
+class _StreamDecoder:
+    """
+    Pulls JSON values one at a time out of a text stream, so the
+    (potentially huge) entities array never has to be held as a whole.
+    """
+
+    def __init__(self, stream: IO[str]):
+        self._stream = stream
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        chunk = self._stream.read(_CHUNK_SIZE)
+        if not chunk:
+            self._eof = True
+            return False
+        if self._pos > _CHUNK_SIZE:
+            self._buf = self._buf[self._pos :]
+            self._pos = 0
+        self._buf += chunk
+        return True
+
+    def _skip_ws(self):
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in " \t\r\n":
+                self._pos += 1
+            if self._pos < len(self._buf) or not self._fill():
+                return
+
+    def peek(self) -> str:
+        self._skip_ws()
+        if self._pos >= len(self._buf):
+            raise ValueError("Unexpected end of level data")
+        return self._buf[self._pos]
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} in level data")
+        self._pos += 1
+
+    def value(self):
+        self._skip_ws()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # a number cut off at the chunk boundary still decodes ("1." -> 1),
+            # so only trust it once a delimiter follows
+            if (
+                not isinstance(value, (dict, list, str))
+                and (end >= len(self._buf) or self._buf[end] not in _DELIMITERS)
+                and self._fill()
+            ):
+                continue
+            self._pos = end
+            return value
+
+
+def _open_text(f: IO[bytes]) -> IO[str]:
+    magic = f.read(2)
+    f.seek(0)
+    if magic == b"\x1f\x8b":
+        f = gzip.GzipFile(fileobj=f)
+    return io.TextIOWrapper(f, encoding="utf8")
+
+
+def iter_level_data(f: IO[bytes]) -> Iterator[Tuple[str, object]]:
+    """
+    Stream-parses a level.data file (gzipped or plain JSON).
+    Yields ("bgmOffset", value), then ("entity", entity) for every entity,
+    and (key, value) for any other top-level key.
+    """
+    reader = _StreamDecoder(_open_text(f))
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        if key == "entities":
+            reader.expect("[")
+            if reader.peek() != "]":
+                while True:
+                    yield "entity", reader.value()
+                    if reader.peek() == "]":
+                        break
+                    reader.expect(",")
+            reader.expect("]")
+        else:
+            yield key, reader.value()
+        if reader.peek() == "}":
+            return
+        reader.expect(",")
+
+
+def _entity_value(entity: dict, name: str) -> Optional[float]:
+    for data in entity.get("data", []):
+        if data.get("name") == name:
+            value = data.get("value")
+            if isinstance(value, (int, float)):
+                return float(value)
+            return None
+    return None
+
+
+def is_note_archetype(archetype: str) -> bool:
+    return archetype.endswith("Note") and not archetype.startswith(_NON_NOTE_PREFIXES)
+
+
+def beat_to_time(beat: float, bpm_changes: List[Tuple[float, float]]) -> float:
+    """
+    Converts a beat to seconds using a sorted list of (beat, bpm) changes.
+    """
+    time = 0.0
+    last_beat = 0.0
+    bpm = bpm_changes[0][1] if bpm_changes else _DEFAULT_BPM
+    for change_beat, change_bpm in bpm_changes:
+        if change_beat >= beat:
+            break
+        time += (change_beat - last_beat) * 60 / bpm
+        last_beat = change_beat
+        bpm = change_bpm
+    return time + (beat - last_beat) * 60 / bpm
+
+
+def extract_level_stats(f: IO[bytes]) -> LevelStats:
+    archetypes: Dict[str, int] = {}
+    bpm_changes: List[Tuple[float, float]] = []
+    bgm_offset = 0.0
+    entities = 0
+    notes = 0
+    first_beat: Optional[float] = None
+    last_beat: Optional[float] = None
+    for key, value in iter_level_data(f):
+        if key == "bgmOffset" and isinstance(value, (int, float)):
+            bgm_offset = float(value)
+        if key != "entity" or not isinstance(value, dict):
+            continue
+        entities += 1
+        archetype = value.get("archetype", "")
+        archetypes[archetype] = archetypes.get(archetype, 0) + 1
+        if archetype == _BPM_CHANGE_ARCHETYPE:
+            beat = _entity_value(value, "#BEAT")
+            bpm = _entity_value(value, "#BPM")
+            if beat is not None and bpm:
+                bpm_changes.append((beat, bpm))
+        elif is_note_archetype(archetype):
+            notes += 1
+            beat = _entity_value(value, "#BEAT")
+            if beat is None:
+                continue
+            if first_beat is None or beat < first_beat:
+                first_beat = beat
+            if last_beat is None or beat > last_beat:
+                last_beat = beat
+    bpm_changes.sort()
+    return {
+        "entities": entities,
+        "notes": notes,
+        "archetypes": archetypes,
+        "bgmOffset": bgm_offset,
+        "bpmChanges": bpm_changes,
+        "firstNoteBeat": first_beat,
+        "lastNoteBeat": last_beat,
+        "firstNoteTime": (
+            beat_to_time(first_beat, bpm_changes) if first_beat is not None else None
+        ),
+        "lastNoteTime": (
+            beat_to_time(last_beat, bpm_changes) if last_beat is not None else None
+        ),
+        "music": None,
+        "size": 0,
+        "mtime": 0.0,
+        "failed": [],
+    }
+
+
+def empty_level_stats() -> LevelStats:
+    """Stats of a level without entities, for level.data that can't be read."""
+    return {
+        "entities": 0,
+        "notes": 0,
+        "archetypes": {},
+        "bgmOffset": 0.0,
+        "bpmChanges": [],
+        "firstNoteBeat": None,
+        "lastNoteBeat": None,
+        "firstNoteTime": None,
+        "lastNoteTime": None,
+        "music": None,
+        "size": 0,
+        "mtime": 0.0,
+        "failed": [],
+    }
@@ -0,0 +1,331 @@
+"""
+In-process metrics, rendered in the Prometheus text format at /metrics.
+
+Hot-path counters and histograms are plain dicts updated from the event
+loop thread only, so they take no locks. The exception is compile timing:
+compiles run on the compile pool's threads, so that one histogram is
+created with threadsafe=True (compiles are rare, the lock is never hot).
+
+Values that already live elsewhere (executor queues, catalog sizes) are
+read at scrape time through collectors instead of being copied around.
+
+Multi-worker mode: the master sets `metrics.shared_dir` before forking,
+every worker writes its snapshot there every FLUSH_INTERVAL seconds (and
+right before answering a scrape), and /metrics merges all snapshots.
+Counters and histograms of workers that died are kept, so totals don't
+go backwards on a restart; collected values only count live workers.
+"""
+
+import asyncio, json, math, os, threading
+from bisect import bisect_left
+
+from typing import Callable, Dict, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COMPILE_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+FLUSH_INTERVAL = 5
+
+Labels = Tuple[str, ...]
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Labels = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def snapshot(self) -> list:
+        return [[list(labels), value] for labels, value in self.values.items()]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Labels = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+        threadsafe: bool = False,
+    ):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # labels -> [per-bucket counts (last one is +Inf), sum, count]
+        self.values: Dict[Labels, list] = {}
+        self._lock = threading.Lock() if threadsafe else None
+
+    def observe(self, value: float, *labels: str):
+        if self._lock:
+            with self._lock:
+                self._observe(value, labels)
+        else:
+            self._observe(value, labels)
+
+    def _observe(self, value: float, labels: Labels):
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def snapshot(self) -> list:
+        return [
+            [list(labels), list(counts), total, count]
+            for labels, (counts, total, count) in list(self.values.items())
+        ]
+
+
+class Collector:
+    """
+    Values read from elsewhere at scrape time. `merge` says how workers
+    combine: "sum" (queue depths) or "max" (catalog sizes, which every
+    worker holds its own copy of).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Labels,
+        collect: Callable[[], Dict[Labels, float]],
+        kind: str = "gauge",
+        merge: str = "sum",
+    ):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.collect = collect
+        self.kind = kind
+        self.merge = merge
+
+    def snapshot(self) -> list:
+        return [[list(labels), value] for labels, value in self.collect().items()]
+
+
+class Ratio:
+    """numerator/total of a counter's values, computed after merging."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, counter: Counter, numerator: Labels):
+        self.name = name
+        self.help = help
+        self.counter = counter
+        self.numerator = numerator
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+        self.shared_dir: Optional[str] = None
+
+    def _register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Labels = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Labels = (), **kwargs):
+        return self._register(Histogram(name, help, labels, **kwargs))
+
+    def collector(self, name: str, help: str, labels: Labels, collect, **kwargs):
+        return self._register(Collector(name, help, labels, collect, **kwargs))
+
+    def ratio(self, name: str, help: str, counter: Counter, numerator: Labels):
+        return self._register(Ratio(name, help, counter, numerator))
+
+    def snapshot(self) -> dict:
+        return {
+            name: metric.snapshot()
+            for name, metric in self.metrics.items()
+            if not isinstance(metric, Ratio)
+        }
+
+    # multi-worker
+
+    def _snapshot_path(self, pid: int) -> str:
+        return os.path.join(self.shared_dir, f"{pid}.json")
+
+    def write_snapshot(self):
+        path = self._snapshot_path(os.getpid())
+        with open(path + ".tmp", "w", encoding="utf8") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(path + ".tmp", path)
+
+    async def flush_periodically(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            try:
+                self.write_snapshot()
+            except OSError:
+                pass
+
+    def _read_snapshots(self) -> List[Tuple[dict, bool]]:
+        self.write_snapshot()
+        snapshots = []
+        for file in os.listdir(self.shared_dir):
+            if not file.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.shared_dir, file), encoding="utf8") as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            snapshots.append((snapshot, _pid_alive(int(file.removesuffix(".json")))))
+        return snapshots
+
+    # output
+
+    def render(self) -> str:
+        if self.shared_dir:
+            snapshots = self._read_snapshots()
+        else:
+            snapshots = [(self.snapshot(), True)]
+        merged = {}
+        for name, metric in self.metrics.items():
+            if isinstance(metric, Ratio):
+                continue
+            values: Dict[Labels, object] = {}
+            for snapshot, alive in snapshots:
+                if isinstance(metric, Collector) and not alive:
+                    continue
+                for labels, *value in snapshot.get(name, []):
+                    _merge_value(metric, values, tuple(labels), value)
+            merged[name] = values
+
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            if isinstance(metric, Ratio):
+                values = merged.get(metric.counter.name, {})
+                total = sum(values.values())
+                hits = values.get(metric.numerator, 0)
+                lines.append(f"{name} {_format(hits / total if total else 0)}")
+                continue
+            for labels, value in merged[name].items():
+                label_pairs = list(zip(metric.labels, labels))
+                if isinstance(metric, Histogram):
+                    counts, total, count = value
+                    cumulative = 0
+                    for bound, bucket in zip(metric.buckets + (math.inf,), counts):
+                        cumulative += bucket
+                        le = label_pairs + [("le", _format(bound))]
+                        lines.append(
+                            f"{name}_bucket{_labels(le)} {_format(cumulative)}"
+                        )
+                    lines.append(f"{name}_sum{_labels(label_pairs)} {_format(total)}")
+                    lines.append(
+                        f"{name}_count{_labels(label_pairs)} {_format(count)}"
+                    )
+                else:
+                    lines.append(f"{name}{_labels(label_pairs)} {_format(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _merge_value(metric, values: dict, labels: Labels, value: list):
+    if isinstance(metric, Histogram):
+        counts, total, count = value
+        current = values.get(labels)
+        if current is None:
+            values[labels] = [list(counts), total, count]
+        else:
+            current[0] = [a + b for a, b in zip(current[0], counts)]
+            current[1] += total
+            current[2] += count
+    elif isinstance(metric, Collector) and metric.merge == "max":
+        values[labels] = max(values.get(labels, value[0]), value[0])
+    else:
+        values[labels] = values.get(labels, 0) + value[0]
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _labels(pairs: List[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+metrics = MetricsRegistry()
+
+http_requests = metrics.counter(
+    "sonolus_http_requests_total",
+    "HTTP requests by route template and status.",
+    ("method", "route", "status"),
+)
+http_latency = metrics.histogram(
+    "sonolus_http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ("method", "route"),
+)
+repository_bytes = metrics.counter(
+    "sonolus_repository_bytes_total", "Bytes served by /sonolus/repository."
+)
+repository_cache = metrics.counter(
+    "sonolus_repository_cache_total",
+    "Repository file cache lookups by result (hit/miss).",
+    ("result",),
+)
+metrics.ratio(
+    "sonolus_repository_cache_hit_ratio",
+    "Share of repository reads answered from the file cache.",
+    repository_cache,
+    ("hit",),
+)
+unlock_cache = metrics.counter(
+    "sonolus_unlock_cache_total",
+    "Per-user unlock set cache lookups by result (hit/miss).",
+    ("result",),
+)
+metrics.ratio(
+    "sonolus_unlock_cache_hit_ratio",
+    "Share of unlock set lookups answered from the cache.",
+    unlock_cache,
+    ("hit",),
+)
+compile_seconds = metrics.histogram(
+    "sonolus_compile_duration_seconds",
+    "Catalog compile duration by item type.",
+    ("item_type",),
+    buckets=COMPILE_BUCKETS,
+    threadsafe=True,
+)
+ingest_jobs = metrics.counter(
+    "sonolus_ingest_jobs_total",
+    "Uploaded charts compiled by the ingest queue, by result (done/failed).",
+    ("result",),
+)
@@ -0,0 +1,107 @@
+import time
+from urllib.parse import parse_qsl
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from helpers.metrics import http_latency, http_requests
+from helpers.profiler import profiler
+
+
+class SonolusMiddleware:
+    """
+    Pure ASGI middleware (no BaseHTTPMiddleware task/queue per request, and
+    streamed bodies pass straight through):
+    - sets request.state.localization from the ?localization= query
+    - adds the Sonolus-Version header to every response
+    - optionally rewrites http:// redirects to https://
+    """
+
+    def __init__(self, app: ASGIApp, version: str, force_https: bool = False):
+        self.app = app
+        self.version = version
+        self.force_https = force_https
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        localization = "en"
+        query_string: bytes = scope.get("query_string", b"")
+        if b"localization=" in query_string:
+            for key, value in parse_qsl(query_string.decode("latin-1")):
+                if key == "localization":
+                    localization = value
+                    break
+        scope.setdefault("state", {})["localization"] = localization
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers["Sonolus-Version"] = self.version
+                if self.force_https:
+                    location = headers.get("location")
+                    if location and location.startswith("http://"):
+                        headers["location"] = location.replace(
+                            "http://", "https://", 1
+                        )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+class MetricsMiddleware:
+    """
+    Counts requests and records latency per route template (e.g.
+    /sonolus/{item_name}/), so path params don't explode the label set.
+    Runs on the event loop, so the counters need no locking.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started_at = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # the router leaves the matched route in the scope
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            http_requests.inc(scope["method"], route, str(status_code))
+            http_latency.observe(
+                time.perf_counter() - started_at, scope["method"], route
+            )
+
+
+class ProfilerMiddleware:
+    """
+    Marks requests picked for profiling as in flight, so the sampling
+    profiler only records while one is running. A single bool check when
+    profiling is off.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not profiler.should_profile():
+            await self.app(scope, receive, send)
+            return
+        profiler.active += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.active -= 1
@@ -0,0 +1,205 @@
+from typing import IO, Iterator, NamedTuple, Optional, Tuple, TypedDict
+
+# bitrates in kbps, indexed by [version row][bitrate index]
+_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_SAMPLE_RATES = {
+    1: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    2.5: [11025, 12000, 8000],
+}
+_VERSIONS = {0: 2.5, 2: 2, 3: 1}
+_LAYERS = {1: 3, 2: 2, 3: 1}
+_SCAN_WINDOW = 16 * 1024
+
+
+class FrameHeader(NamedTuple):
+    version: float
+    layer: int
+    bitrate: int  # kbps
+    sample_rate: int
+    samples: int
+    length: int
+    channels: int
+
+
+class Mp3Info(TypedDict):
+    duration: float  # seconds
+    bitrate: int  # kbps, averaged for VBR
+    sampleRate: int
+    vbr: bool
+
+
+def parse_frame_header(header: bytes) -> Optional[FrameHeader]:
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version = _VERSIONS.get((header[1] >> 3) & 3)
+    layer = _LAYERS.get((header[1] >> 1) & 3)
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 3
+    if (
+        version is None
+        or layer is None
+        or bitrate_index in (0, 15)  # free format / invalid
+        or sample_rate_index == 3
+    ):
+        return None
+    padding = (header[2] >> 1) & 1
+    bitrate = _BITRATES[(1 if version == 1 else 2, layer)][bitrate_index]
+    sample_rate = _SAMPLE_RATES[version][sample_rate_index]
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate * 1000 // sample_rate + padding) * 4
+    else:
+        samples = 1152 if layer == 2 or version == 1 else 576
+        length = samples // 8 * bitrate * 1000 // sample_rate + padding
+    channels = 1 if header[3] >> 6 == 3 else 2
+    return FrameHeader(version, layer, bitrate, sample_rate, samples, length, channels)
+
+
+def id3v2_size(header: bytes) -> int:
+    """
+    Size of a leading ID3v2 tag (0 if there is none).
+    """
+    if len(header) < 10 or header[:3] != b"ID3":
+        return 0
+    size = 0
+    for b in header[6:10]:
+        size = (size << 7) | (b & 0x7F)
+    footer = 10 if header[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def find_frame(data: bytes, start: int = 0) -> Optional[Tuple[int, FrameHeader]]:
+    """
+    Finds the first frame in `data` whose header is confirmed by the frame
+    right after it (or by the end of the buffer).
+    """
+    pos = data.find(b"\xff", start)
+    while 0 <= pos <= len(data) - 4:
+        header = parse_frame_header(data[pos : pos + 4])
+        if header:
+            next_pos = pos + header.length
+            if next_pos + 4 > len(data):
+                return pos, header
+            following = parse_frame_header(data[next_pos : next_pos + 4])
+            if following and following.sample_rate == header.sample_rate:
+                return pos, header
+        pos = data.find(b"\xff", pos + 1)
+    return None
+
+
+def iter_frames(data: bytes, start: int = 0) -> Iterator[Tuple[int, FrameHeader]]:
+    """
+    Walks consecutive frames, stopping at the first byte that is not a frame.
+    """
+    found = find_frame(data, start)
+    if not found:
+        return
+    pos, header = found
+    while header and pos + header.length <= len(data):
+        yield pos, header
+        pos += header.length
+        header = parse_frame_header(data[pos : pos + 4])
+
+
+def _side_info_size(header: FrameHeader) -> int:
+    if header.version == 1:
+        return 17 if header.channels == 1 else 32
+    return 9 if header.channels == 1 else 17
+
+
+def _read_vbr_header(frame: bytes, header: FrameHeader) -> Optional[Tuple[int, int]]:
+    """
+    Returns (frame count, byte count) from a Xing/Info or VBRI header.
+    Byte count is 0 when the header doesn't carry one.
+    """
+    offset = 4 + _side_info_size(header)
+    tag = frame[offset : offset + 4]
+    if tag in (b"Xing", b"Info"):
+        flags = int.from_bytes(frame[offset + 4 : offset + 8], "big")
+        pos = offset + 8
+        frames = nbytes = 0
+        if flags & 1:
+            frames = int.from_bytes(frame[pos : pos + 4], "big")
+            pos += 4
+        if flags & 2:
+            nbytes = int.from_bytes(frame[pos : pos + 4], "big")
+        if frames:
+            return frames, nbytes
+        return None
+    if frame[36:40] == b"VBRI":
+        nbytes = int.from_bytes(frame[46:50], "big")
+        frames = int.from_bytes(frame[50:54], "big")
+        if frames:
+            return frames, nbytes
+    return None
+
+
+def read_mp3_info(f: IO[bytes], size: int) -> Optional[Mp3Info]:
+    """
+    Reads duration and bitrate of an MP3 of `size` bytes from the tag and
+    first frame headers only. Works on zip members (ZipFile.open).
+    """
+    head = f.read(10)
+    skip = id3v2_size(head)
+    if skip:
+        f.seek(skip)
+        head = b""
+    window = head + f.read(_SCAN_WINDOW)
+    found = find_frame(window)
+    if not found:
+        return None
+    pos, header = found
+    audio_start = skip + pos
+    audio_bytes = size - audio_start
+    vbr = _read_vbr_header(window[pos : pos + header.length], header)
+    if vbr:
+        frames, nbytes = vbr
+        duration = frames * header.samples / header.sample_rate
+        if nbytes:
+            audio_bytes = nbytes
+        bitrate = round(audio_bytes * 8 / duration / 1000) if duration else 0
+        # an "Info" frame marks CBR files that were still given a frame count
+        is_vbr = bitrate != header.bitrate
+    else:
+        bitrate = header.bitrate
+        duration = audio_bytes * 8 / (bitrate * 1000)
+        is_vbr = False
+    return {
+        "duration": round(duration, 3),
+        "bitrate": bitrate,
+        "sampleRate": header.sample_rate,
+        "vbr": is_vbr,
+    }
+
+
+def slice_mp3(data: bytes, start: float, length: float) -> Optional[bytes]:
+    """
+    Cuts the frames covering [start, start + length) seconds straight out of
+    the bitstream, without decoding. Leading tags and the Xing/VBRI frame are
+    dropped, so the clip is a plain stream of audio frames.
+    """
+    time = 0.0
+    first = last = None
+    frames = iter_frames(data, id3v2_size(data[:10]))
+    for i, (pos, header) in enumerate(frames):
+        if i == 0 and _read_vbr_header(data[pos : pos + header.length], header):
+            continue
+        duration = header.samples / header.sample_rate
+        # from the frame that's playing at `start`
+        if first is None and time + duration > start:
+            first = pos
+        time += duration
+        last = pos + header.length
+        if time >= start + length:
+            break
+    if first is None:
+        return None
+    return data[first:last]
@@ -0,0 +1,30 @@
+"""
+bcrypt password hashing. Each call burns 100-300ms of CPU, so the routes
+run these in the "auth" process pool (app.run_blocking(..., pool="auth"))
+rather than on the event loop.
+"""
+
+# bcrypt only looks at the first 72 bytes; bcrypt>=5 raises for longer
+# passwords instead of ignoring the rest, so cut them like passlib did
+MAX_PASSWORD_BYTES = 72
+
+
+def _password_bytes(password: str) -> bytes:
+    return password.encode("utf8")[:MAX_PASSWORD_BYTES]
+
+
+def hash_password(password: str) -> str:
+    # imported here, so only the auth pool's processes load bcrypt
+    import bcrypt
+
+    return bcrypt.hashpw(_password_bytes(password), bcrypt.gensalt()).decode("ascii")
+
+
+def verify_password(plain: str, hashed: str) -> bool:
+    import bcrypt
+
+    try:
+        return bcrypt.checkpw(_password_bytes(plain), hashed.encode("ascii"))
+    except ValueError:
+        # not a bcrypt hash
+        return False
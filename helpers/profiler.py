@@ -0,0 +1,214 @@
+"""
+Opt-in sampling profiler for live requests.
+
+While running, a daemon thread wakes every `interval` seconds and, if a
+profiled request is in flight, records the stack of every other thread
+(the event loop plus the io/compile pool threads) from
+sys._current_frames(). Output is the collapsed-stack format flamegraph
+tools read: "thread;outer (file:line);...;inner (file:line) count".
+
+When it's off there is no thread and requests only pay for one bool
+check in ProfilerMiddleware. Process pools (cpu/render) aren't sampled.
+
+Multi-worker: start/stop write a control file into `shared_dir` that every
+worker follows (see follow()), and each worker drops its stacks next to
+it, so collapsed() can merge all workers.
+"""
+
+import asyncio, json, os, random, sys, threading, time
+from collections import Counter
+
+from typing import Dict, Optional
+
+CONTROL_FILE = "profiler.json"
+FOLLOW_INTERVAL = 1
+MAX_DEPTH = 128
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self.running = False
+        self.interval = 0.005
+        self.sample_rate = 1.0
+        self.until: Optional[float] = None
+        self.generation = 0
+        self.shared_dir: Optional[str] = None
+
+        self.active = 0  # profiled requests in flight, event loop only
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self._lock = threading.Lock()  # stacks: sampler thread vs. readers
+        self._labels: Dict[object, str] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def should_profile(self) -> bool:
+        return self.running and (
+            self.sample_rate >= 1 or random.random() < self.sample_rate
+        )
+
+    def start(self, interval: float, sample_rate: float, duration: float):
+        """
+        Starts (or restarts with new settings) sampling in this process and,
+        in multi-worker mode, tells the other workers to do the same.
+        Stacks from the previous run are dropped.
+        """
+        self.generation += 1
+        self._clear_shared_stacks()
+        self._apply(
+            {
+                "generation": self.generation,
+                "running": True,
+                "interval": interval,
+                "sampleRate": sample_rate,
+                "until": time.time() + duration,
+            }
+        )
+        self._write_control()
+
+    def stop(self):
+        self.generation += 1
+        self._apply({"generation": self.generation, "running": False})
+        self._write_control()
+
+    def _apply(self, control: dict):
+        self.generation = control["generation"]
+        if not control["running"]:
+            self.running = False
+            return
+        self.interval = control["interval"]
+        self.sample_rate = control["sampleRate"]
+        self.until = control["until"]
+        with self._lock:
+            self.stacks = Counter()
+        self.samples = 0
+        self.running = True
+        if not self._thread or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name="profiler", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        own = threading.get_ident()
+        while self.running:
+            if time.time() > self.until:
+                self.running = False
+                break
+            if self.active > 0:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident != own:
+                        self._record(names.get(ident, str(ident)), frame)
+                self.samples += 1
+            time.sleep(self.interval)
+
+    def _record(self, thread_name: str, frame):
+        labels = []
+        while frame is not None and len(labels) < MAX_DEPTH:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = (
+                    f"{code.co_name} ({_short_path(code.co_filename)}:"
+                    f"{code.co_firstlineno})"
+                )
+            labels.append(label)
+            frame = frame.f_back
+        labels.append(thread_name)
+        with self._lock:
+            self.stacks[";".join(reversed(labels))] += 1
+
+    def _snapshot_stacks(self) -> Counter:
+        with self._lock:
+            return Counter(self.stacks)
+
+    def status(self) -> dict:
+        return {
+            "running": self.running,
+            "interval": self.interval,
+            "sampleRate": self.sample_rate,
+            "until": self.until,
+            "samples": self.samples,
+            "stacks": len(self.stacks),
+        }
+
+    # multi-worker
+
+    def _write_control(self):
+        if not self.shared_dir:
+            return
+        path = os.path.join(self.shared_dir, CONTROL_FILE)
+        control = {"generation": self.generation, "running": self.running}
+        if self.running:
+            control.update(
+                interval=self.interval, sampleRate=self.sample_rate, until=self.until
+            )
+        with open(path + ".tmp", "w", encoding="utf8") as f:
+            json.dump(control, f)
+        os.replace(path + ".tmp", path)
+
+    def _clear_shared_stacks(self):
+        if not self.shared_dir:
+            return
+        for file in os.listdir(self.shared_dir):
+            if file.endswith(".stacks"):
+                try:
+                    os.remove(os.path.join(self.shared_dir, file))
+                except OSError:
+                    pass
+
+    def _write_stacks(self):
+        path = os.path.join(self.shared_dir, f"{os.getpid()}.stacks")
+        with open(path + ".tmp", "w", encoding="utf8") as f:
+            json.dump(self._snapshot_stacks(), f)
+        os.replace(path + ".tmp", path)
+
+    async def follow(self):
+        """
+        Worker loop: pick up start/stop from the control file and publish
+        this worker's stacks while a run is going (and once after it ends).
+        """
+        path = os.path.join(self.shared_dir, CONTROL_FILE)
+        was_running = False
+        while True:
+            await asyncio.sleep(FOLLOW_INTERVAL)
+            try:
+                if os.path.exists(path):
+                    with open(path, encoding="utf8") as f:
+                        control = json.load(f)
+                    if control["generation"] != self.generation:
+                        self._apply(control)
+                if self.running or was_running:
+                    self._write_stacks()
+                was_running = self.running
+            except (OSError, ValueError, KeyError):
+                pass
+
+    # output
+
+    def collapsed(self) -> str:
+        stacks = self._snapshot_stacks()
+        if self.shared_dir:
+            self._write_stacks()
+            stacks = Counter()
+            for file in os.listdir(self.shared_dir):
+                if not file.endswith(".stacks"):
+                    continue
+                try:
+                    with open(os.path.join(self.shared_dir, file), encoding="utf8") as f:
+                        stacks.update(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def _short_path(path: str) -> str:
+    # repo files relative to the repo, libraries from their package down
+    cwd = os.getcwd()
+    if path.startswith(cwd + os.sep):
+        return os.path.relpath(path, cwd)
+    _, sep, rest = path.rpartition("site-packages" + os.sep)
+    return rest if sep else os.path.basename(path)
+
+
+profiler = SamplingProfiler()
@@ -1,17 +1,26 @@
 from helpers.sha1 import calculate_sha1
 
-from typing import Optional, Union, IO
+from typing import Dict, Optional, Union, IO
 from helpers.datastructs import SRL
 
 from pathlib import Path
+from collections import OrderedDict
 from io import BytesIO
 from zipfile import ZipFile
 import os
 
 
 class Repository:
-    def __init__(self):
+    def __init__(self, cache_size: int = 64 * 1024 * 1024):
         self._map = {}
+        # abspath -> hash for entries backed by a path, so path lookups
+        # don't scan the whole map (that made compiling n levels O(n^2))
+        self._paths: Dict[str, str] = {}
+        # hash -> bytes for recently served files. Only touched from the
+        # event loop (see get_cached / cache_file), so no locking.
+        self._cache: OrderedDict[str, bytes] = OrderedDict()
+        self._cache_size = cache_size
+        self._cache_bytes = 0
 
     def _read_from_zip_chain(self, parts: list[str]) -> bytes:
         """
@@ -42,17 +51,40 @@ class Repository:
                 return None
         hash = self.get_hash_from_file_path(file)
         if hash:
-            del self._map[hash]
+            self._remove(hash)
         if "|" in str(file):
             file_data = self._read_from_zip_chain(str(file).split("|"))
             sha1 = calculate_sha1(file_data)
         else:
             sha1 = calculate_sha1(file)
-        file_path = str(file)
         if sha1 not in self._map.keys():
-            self._map[sha1] = {"hash": sha1, "file": file_path}
+            self.register(sha1, file)
         return sha1
 
+    def add_file_hash(self, file: os.PathLike, sha1: str) -> str:
+        """
+        Like add_file, for a hash computed elsewhere (e.g. in a process pool).
+        """
+        hash = self.get_hash_from_file_path(file)
+        if hash:
+            self._remove(hash)
+        if sha1 not in self._map.keys():
+            self.register(sha1, file)
+        return sha1
+
+    def register(self, sha1: str, file: os.PathLike):
+        """
+        Maps a hash to a file path as-is, e.g. when reloading a compiled
+        catalog whose hashes are already known.
+        """
+        self._map[sha1] = {"hash": sha1, "file": str(file)}
+        self._paths[os.path.abspath(file)] = sha1
+
+    def _remove(self, hash: str):
+        item = self._map.pop(hash)
+        if isinstance(item["file"], str):
+            self._paths.pop(os.path.abspath(item["file"]), None)
+
     def add_bytes(self, data: Union[IO[bytes], bytes]):
         """
         Warning: cannot be updated!
@@ -64,7 +96,7 @@ class Repository:
     def pop_hash(self, hash: str) -> Optional[bytes]:
         file_data = self.get_file(hash)
         if file_data:
-            del self._map[hash]
+            self._remove(hash)
         return file_data
 
     def update_file(self, file: os.PathLike):
@@ -74,14 +106,7 @@ class Repository:
         self.add_file(file)
 
     def get_hash_from_file_path(self, file: os.PathLike) -> Optional[str]:
-        input_path = os.path.abspath(file)
-        for sha1, data in self._map.items():
-            if type(data["file"]) != str:
-                continue
-            stored_path = os.path.abspath(data["file"])
-            if input_path == stored_path:
-                return sha1
-        return None
+        return self._paths.get(os.path.abspath(file))
 
     def get_file(self, hash: str) -> Optional[bytes]:
         item = self._map.get(hash, None)
@@ -105,6 +130,26 @@ class Repository:
             file_data = file
         return file_data
 
+    def get_cached(self, hash: str) -> Optional[bytes]:
+        data = self._cache.get(hash)
+        if data is not None:
+            self._cache.move_to_end(hash)
+        return data
+
+    def cache_file(self, hash: str, data: bytes):
+        # big files would just push everything else out
+        if hash in self._cache or len(data) > self._cache_size // 8:
+            return
+        self._cache[hash] = data
+        self._cache_bytes += len(data)
+        while self._cache_bytes > self._cache_size:
+            _, evicted = self._cache.popitem(last=False)
+            self._cache_bytes -= len(evicted)
+
+    def clear_cache(self):
+        self._cache.clear()
+        self._cache_bytes = 0
+
     def get_srl(self, hash: str) -> Optional[SRL]:
         if hash in self._map.keys():
             return {"hash": hash, "url": f"/sonolus/repository/{hash}"}
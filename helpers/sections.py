@@ -0,0 +1,84 @@
+import heapq, random
+
+from collections import deque
+from typing import Deque, Dict, List, Tuple
+
+from helpers.datastructs import LevelItem, ServerItemSection
+from helpers.data_helpers import create_section
+
+SECTION_SIZE = 5
+
+
+class LevelSectionIndex:
+    """
+    Level sections for /sonolus/levels/info, maintained one level at a time
+    as the catalog grows. Readers only ever copy the prebuilt lists (or
+    sample SECTION_SIZE items from `_pool`), so serving is O(k) no matter
+    how big the catalog is.
+    """
+
+    def __init__(self, size: int = SECTION_SIZE):
+        self.size = size
+        self._seq = 0
+        self._newest: Deque[LevelItem] = deque(maxlen=size)
+        # a level's "rating" is its difficulty, not a user rating
+        self._hardest: List[Tuple[int, int, LevelItem]] = []  # min-heap
+        self._engines: Dict[str, Deque[LevelItem]] = {}
+        self._engine_titles: Dict[str, str] = {}
+        self._pool: List[LevelItem] = []
+
+        # prebuilt, replaced (never mutated) so readers need no locking
+        self.newest: List[LevelItem] = []
+        self.hardest: List[LevelItem] = []
+        self.engines: Dict[str, List[LevelItem]] = {}
+
+    def add(self, level: LevelItem):
+        self._seq += 1
+        self._pool.append(level)
+
+        self._newest.appendleft(level)
+        self.newest = list(self._newest)
+
+        entry = (level.get("rating", 0), self._seq, level)
+        if len(self._hardest) < self.size:
+            heapq.heappush(self._hardest, entry)
+        elif entry[:2] > self._hardest[0][:2]:
+            heapq.heapreplace(self._hardest, entry)
+        else:
+            entry = None
+        if entry:
+            self.hardest = [
+                item for _, _, item in sorted(self._hardest, reverse=True)
+            ]
+
+        engine = level["engine"]["name"]
+        if engine not in self._engines:
+            self._engines[engine] = deque(maxlen=self.size)
+            self._engine_titles[engine] = level["engine"]["title"]
+        self._engines[engine].appendleft(level)
+        engines = dict(self.engines)
+        engines[engine] = list(self._engines[engine])
+        self.engines = engines
+
+    def random(self) -> List[LevelItem]:
+        pool = self._pool
+        return random.sample(pool, min(self.size, len(pool)))
+
+    def sections(self) -> List[ServerItemSection]:
+        if not self._pool:
+            return []
+        sections = [
+            create_section("#NEWEST", "levels", self.newest, icon="clock"),
+            create_section("#RANDOM", "levels", self.random(), icon="shuffle"),
+            create_section("Hardest", "levels", self.hardest, icon="star"),
+        ]
+        for engine, items in self.engines.items():
+            sections.append(
+                create_section(
+                    self._engine_titles[engine], "levels", items, icon="engine"
+                )
+            )
+        return sections
+
+
+level_sections = LevelSectionIndex()
@@ -0,0 +1,59 @@
+import time
+
+from typing import Dict, Optional
+
+
+class ServerStats:
+    """
+    Catalog counters kept up to date by the compilers, so readers
+    (e.g. /sonolus/info) never have to walk the catalog themselves.
+    `version` changes whenever anything does, for cheap cache checks.
+    """
+
+    def __init__(self):
+        self.items: Dict[str, int] = {}
+        self.bytes: Dict[str, int] = {}
+        self.engines: Dict[str, int] = {}
+        self.compiled_at: Dict[str, float] = {}
+        self.last_compile: Optional[float] = None
+        self.version = 0
+
+    def _touch(self, item_type: str):
+        self.last_compile = time.time()
+        self.compiled_at[item_type] = self.last_compile
+        self.version += 1
+
+    def set_items(self, item_type: str, count: int, size: int = 0):
+        self.items[item_type] = count
+        self.bytes[item_type] = size
+        self._touch(item_type)
+
+    def set_levels(self, engines: Dict[str, int], size: int = 0):
+        self.engines = dict(engines)
+        self.set_items("levels", sum(engines.values()), size)
+
+    def add_level(self, engine: str, size: int = 0):
+        self.items["levels"] = self.items.get("levels", 0) + 1
+        self.bytes["levels"] = self.bytes.get("levels", 0) + size
+        self.engines[engine] = self.engines.get(engine, 0) + 1
+        self._touch("levels")
+
+    def count(self, item_type: str) -> int:
+        return self.items.get(item_type, 0)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self.bytes.values())
+
+    def snapshot(self) -> dict:
+        return {
+            "items": dict(self.items),
+            "bytes": dict(self.bytes),
+            "totalBytes": self.total_bytes,
+            "engines": dict(self.engines),
+            "compiledAt": dict(self.compiled_at),
+            "lastCompile": self.last_compile,
+        }
+
+
+server_stats = ServerStats()
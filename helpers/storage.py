@@ -1,15 +1,88 @@
 # helpers/storage.py
+import hashlib
 import os
 import shutil
+import tempfile
+from typing import IO, NamedTuple
 from uuid import uuid4
+from zipfile import BadZipFile, ZipFile
 
 DYNAMIC_PATH = None
+MAX_UPLOAD_SIZE = 200 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# what the level compiler reads from every chart zip
+REQUIRED_LEVEL_MEMBERS = ("level.json", "level.data", "jacket.png", "music.mp3")
+
+class UploadTooLarge(Exception):
+    pass
+
+class InvalidChart(Exception):
+    pass
+
+class StoredChart(NamedTuple):
+    uid: str
+    path: str
+    sha1: str
+    size: int
 
 def init_storage(config):
-    global DYNAMIC_PATH
+    global DYNAMIC_PATH, MAX_UPLOAD_SIZE
     DYNAMIC_PATH = config.get("dynamic-storage-path", "./dynamic_charts")
+    MAX_UPLOAD_SIZE = config.get("max-upload-mb", 200) * 1024 * 1024
     os.makedirs(DYNAMIC_PATH, exist_ok=True)
 
+def store_chart_upload(source: IO[bytes]) -> StoredChart:
+    """
+    Copies an upload into DYNAMIC_PATH/<uid>/chart.zip chunk by chunk, hashing as it
+    goes, and only moves it into place (atomically) once it's under
+    MAX_UPLOAD_SIZE and a zip with every REQUIRED_LEVEL_MEMBERS. Blocking:
+    run it in the io pool. Raises UploadTooLarge or InvalidChart, leaving
+    nothing behind.
+    """
+    # the temp file sits in DYNAMIC_PATH so os.replace stays on one filesystem
+    tmp = tempfile.NamedTemporaryFile(dir=DYNAMIC_PATH, prefix=".upload-", delete=False)
+    created_dir = None
+    try:
+        with tmp:
+            size = 0
+            sha1 = hashlib.sha1()
+            while chunk := source.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_UPLOAD_SIZE:
+                    raise UploadTooLarge(f"Upload exceeds {MAX_UPLOAD_SIZE / 1024 / 1024:g} MiB")
+                sha1.update(chunk)
+                tmp.write(chunk)
+        _check_level_zip(tmp.name)
+
+        uid = uuid4().hex
+        song_dir = os.path.join(DYNAMIC_PATH, uid)
+        # a fixed name: client filenames can be "..", or hold "|", which
+        # separates zip members in repository paths
+        filepath = os.path.join(song_dir, "chart.zip")
+        os.makedirs(song_dir)
+        created_dir = song_dir
+        os.replace(tmp.name, filepath)
+    except BaseException:
+        try:
+            os.remove(tmp.name)
+        except OSError:
+            pass
+        if created_dir:
+            shutil.rmtree(created_dir, ignore_errors=True)
+        raise
+    return StoredChart(uid, filepath, sha1.hexdigest(), size)
+
+def _check_level_zip(path: str):
+    # only reads the central directory
+    try:
+        with ZipFile(path) as zip_file:
+            names = set(zip_file.namelist())
+    except BadZipFile:
+        raise InvalidChart("Upload is not a zip file")
+    missing = [name for name in REQUIRED_LEVEL_MEMBERS if name not in names]
+    if missing:
+        raise InvalidChart(f"Chart zip is missing {', '.join(missing)}")
+
 def save_chart_file(filename: str, content: bytes):
     # create unique id directory for each song
     uid = uuid4().hex
@@ -0,0 +1,72 @@
+"""
+Small in-process caches for values that also live in the database.
+
+TTLCache is an LRU bounded by entry count whose entries also expire
+after `ttl` seconds. Writers in this process invalidate entries directly
+(write-through); the TTL bounds how stale another worker's copy can get.
+Like the metrics, it's only touched from the event loop, so no locks.
+"""
+
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from typing import Any, Hashable, Iterable, Optional, Tuple
+
+
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """`ttl` shortens (never extends) the cache's TTL for this entry."""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class IntSet:
+    """
+    Read-only set of ints as a sorted array: 8 bytes per member instead of
+    the ~60 a set of ints takes, with O(log n) membership.
+    """
+
+    __slots__ = ("_values",)
+
+    def __init__(self, values: Iterable[int]):
+        self._values = array("q", sorted(set(values)))
+
+    def __contains__(self, value: int) -> bool:
+        i = bisect_left(self._values, value)
+        return i < len(self._values) and self._values[i] == value
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __iter__(self):
+        return iter(self._values)
@@ -1,33 +1,65 @@
 # models.py
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index
 from typing import Optional, List
-from datetime import datetime
+from datetime import datetime, timezone
+
+def utcnow() -> datetime:
+    # sqlmodel refuses naive datetimes on insert
+    return datetime.now(timezone.utc)
 
 class User(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     username: str = Field(index=True, unique=True)
     hashed_password: str
     is_admin: bool = False
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=utcnow)
 
     unlocks: List["UserUnlock"] = Relationship(back_populates="user")
 
 class Song(SQLModel, table=True):
+    # keyset pagination for /api/charts (newest first)
+    __table_args__ = (Index("ix_song_created_at_id", "created_at", "id"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     song_id: str = Field(index=True, unique=True)  # identifier (filename or uuid)
     title: str
     author: Optional[str] = None
     path: str  # path to chart / assets in dynamic storage
     default_locked: bool = False  # if True, locked by default
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=utcnow)
 
     unlocks: List["UserUnlock"] = Relationship(back_populates="song")
 
 class UserUnlock(SQLModel, table=True):
+    # one row per (user, song): lookups are index seeks and unlocking is an upsert
+    __table_args__ = (
+        Index("ux_userunlock_user_id_song_id", "user_id", "song_id", unique=True),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id")
     song_id: int = Field(foreign_key="song.id")
-    unlocked_at: datetime = Field(default_factory=datetime.utcnow)
+    unlocked_at: datetime = Field(default_factory=utcnow)
 
     user: Optional[User] = Relationship(back_populates="unlocks")
     song: Optional[Song] = Relationship(back_populates="unlocks")
+
+class IngestJob(SQLModel, table=True):
+    # compiling an uploaded chart into the Sonolus catalog, see helpers/ingest.py
+    # autoincrement: ids are never reused, workers scan for finished jobs by id
+    __table_args__ = (
+        Index("ix_ingestjob_status_id", "status", "id"),
+        {"sqlite_autoincrement": True},
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    song_id: str = Field(unique=True)  # Song.song_id, also the level's name
+    path: str  # the chart zip
+    status: str = "queued"  # queued -> running -> done | failed
+    attempts: int = 0
+    error: Optional[str] = None
+    result: Optional[str] = None  # compiled level as JSON, published by every worker
+    created_at: datetime = Field(default_factory=utcnow)
+    claimed_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
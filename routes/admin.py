@@ -0,0 +1,125 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+from typing import List, Optional
+
+import crud
+from crud import CachedUser
+from models import IngestJob
+from routes.charts import get_username_from_token
+from helpers.profiler import profiler
+
+router = APIRouter()
+
+# users x songs per /unlocks call
+MAX_BATCH_UNLOCKS = 100_000
+# longest profiler session, in seconds
+MAX_PROFILE_SECONDS = 600
+
+
+class UnlockGrant(BaseModel):
+    usernames: List[str]
+    song_ids: List[str]
+
+
+def _ingest_job(job: IngestJob) -> dict:
+    # everything but the compiled level
+    return {
+        "id": job.id,
+        "song_id": job.song_id,
+        "status": job.status,
+        "attempts": job.attempts,
+        "error": job.error,
+        "created_at": job.created_at,
+        "claimed_at": job.claimed_at,
+        "finished_at": job.finished_at,
+    }
+
+
+async def require_admin(
+    username: Optional[str] = Depends(get_username_from_token),
+) -> CachedUser:
+    if not username:
+        raise HTTPException(401, "Auth required")
+    user = await crud.get_cached_user(username)
+    if not user or not user.is_admin:
+        raise HTTPException(403, "Admin required")
+    return user
+
+
+@router.post("/unlocks")
+async def grant_unlocks(grant: UnlockGrant, user: CachedUser = Depends(require_admin)):
+    """
+    Unlocks every listed song for every listed user in one transaction,
+    e.g. many songs for one user or one song for many users. Idempotent.
+    """
+    if len(grant.usernames) * len(grant.song_ids) > MAX_BATCH_UNLOCKS:
+        raise HTTPException(
+            400, f"At most {MAX_BATCH_UNLOCKS:,} user/song pairs per request"
+        )
+    return await crud.grant_unlocks(grant.usernames, grant.song_ids)
+
+
+@router.get("/ingest")
+async def list_ingest_jobs(
+    status: Optional[str] = Query(None, pattern="^(queued|running|done|failed)$"),
+    limit: int = Query(50, ge=1, le=500),
+    user: CachedUser = Depends(require_admin),
+):
+    """Newest ingest jobs (uploads being compiled into the catalog)."""
+    return [_ingest_job(job) for job in await crud.list_ingest_jobs(status, limit)]
+
+
+@router.get("/ingest/{job_id}")
+async def get_ingest_job(job_id: int, user: CachedUser = Depends(require_admin)):
+    job = await crud.get_ingest_job(job_id)
+    if job is None:
+        raise HTTPException(404, "Ingest job not found")
+    return _ingest_job(job)
+
+
+@router.post("/ingest/{job_id}/retry")
+async def retry_ingest_job(
+    job_id: int, request: Request, user: CachedUser = Depends(require_admin)
+):
+    """Queues a failed job again, as a new job (returned)."""
+    job = await crud.get_ingest_job(job_id)
+    if job is None:
+        raise HTTPException(404, "Ingest job not found")
+    retry = await crud.retry_ingest_job(job_id)
+    if retry is None:
+        raise HTTPException(409, f"Ingest job is {job.status}, only failed jobs can be retried")
+    request.app.ingest.wake()
+    return _ingest_job(retry)
+
+
+@router.get("/profiler")
+async def profiler_status(user: CachedUser = Depends(require_admin)):
+    return profiler.status()
+
+
+@router.post("/profiler/start")
+async def profiler_start(
+    interval_ms: float = Query(5, ge=1, le=1000),
+    sample_rate: float = Query(1.0, gt=0, le=1),
+    duration: float = Query(30, gt=0, le=MAX_PROFILE_SECONDS),
+    user: CachedUser = Depends(require_admin),
+):
+    """
+    Samples stacks while `sample_rate` of requests are in flight, for
+    `duration` seconds (it stops by itself, at most MAX_PROFILE_SECONDS).
+    """
+    profiler.start(interval_ms / 1000, sample_rate, duration)
+    return profiler.status()
+
+
+@router.post("/profiler/stop")
+async def profiler_stop(user: CachedUser = Depends(require_admin)):
+    profiler.stop()
+    return profiler.status()
+
+
+@router.get("/profiler/stacks")
+async def profiler_stacks(user: CachedUser = Depends(require_admin)):
+    """Collapsed stacks, e.g. for flamegraph.pl or speedscope."""
+    return PlainTextResponse(profiler.collapsed())
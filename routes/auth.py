@@ -1,15 +1,11 @@
 # routes/auth.py
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel
-from passlib.context import CryptContext
-from jose import jwt
 from datetime import datetime, timedelta
-from sqlmodel import select
-from models import User
-from db import engine
+import crud
+from helpers.passwords import hash_password, verify_password
 
 router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 SECRET_KEY = "dev-secret-please-change"  # set from env in production
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7
@@ -22,31 +18,28 @@ class UserCreate(BaseModel):
     username: str
     password: str
 
-def verify_password(plain, hashed):
-    return pwd_context.verify(plain, hashed)
-
-def get_password_hash(password):
-    return pwd_context.hash(password)
+# bcrypt runs in the "auth" process pool (capped, 429 when it's full),
+# so a burst of logins doesn't stall the event loop for everyone else
 
 @router.post("/register")
-async def register(u: UserCreate):
-    async with engine.connect() as conn:
-        result = await conn.execute(select(User).where(User.username == u.username))
-        existing = result.scalars().first()
-        if existing:
-            raise HTTPException(400, "User already exists")
-    user = User(username=u.username, hashed_password=get_password_hash(u.password))
-    async with engine.begin() as conn:
-        conn.add(user)
+async def register(u: UserCreate, request: Request):
+    if await crud.get_user_by_username(u.username):
+        raise HTTPException(400, "User already exists")
+    hashed = await request.app.run_blocking(hash_password, u.password, pool="auth")
+    if not await crud.create_user(u.username, hashed):
+        # registered by someone else while we were hashing
+        raise HTTPException(400, "User already exists")
     return {"ok": True}
 
 @router.post("/token", response_model=Token)
-async def login_for_token(u: UserCreate):
-    async with engine.connect() as conn:
-        result = await conn.execute(select(User).where(User.username == u.username))
-        user = result.scalars().first()
-        if not user or not verify_password(u.password, user.hashed_password):
-            raise HTTPException(status_code=401, detail="Incorrect username or password")
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        token = jwt.encode({"sub": user.username, "exp": expire}, SECRET_KEY, algorithm=ALGORITHM)
-        return {"access_token": token}
+async def login_for_token(u: UserCreate, request: Request):
+    user = await crud.get_user_by_username(u.username)
+    if not user or not await request.app.run_blocking(
+        verify_password, u.password, user.hashed_password, pool="auth"
+    ):
+        raise HTTPException(status_code=401, detail="Incorrect username or password")
+    from jose import jwt
+
+    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    token = jwt.encode({"sub": user.username, "exp": expire}, SECRET_KEY, algorithm=ALGORITHM)
+    return {"access_token": token}
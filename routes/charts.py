@@ -1,12 +1,10 @@
 # routes/charts.py
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Header
+import time
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Header, Query, Request
 from typing import List, Optional
-from helpers.storage import save_chart_file
+from helpers.storage import InvalidChart, UploadTooLarge, store_chart_upload
+from helpers.ttl_cache import TTLCache
 import crud
-from db import engine
-from models import Song, User, UserUnlock
-from sqlmodel import select
-from jose import jwt
 
 router = APIRouter()
 
@@ -14,92 +12,128 @@ router = APIRouter()
 SECRET_KEY = "dev-secret-please-change"
 ALGORITHM = "HS256"
 
-def get_username_from_token(authorization: Optional[str] = Header(None)):
+# token -> decoded claims, so repeat requests skip the signature check;
+# entries never outlive the token's exp
+TOKEN_CACHE_SIZE = 10_000
+TOKEN_CACHE_TTL = 300
+token_claims = TTLCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
+
+# async (with no awaits) so FastAPI runs it on the event loop, which the
+# cache relies on, instead of a threadpool hop per request
+async def get_username_from_token(authorization: Optional[str] = Header(None)):
     if not authorization:
         return None
     try:
         scheme, token = authorization.split()
-        if scheme.lower() != "bearer":
+    except ValueError:
+        return None
+    if scheme.lower() != "bearer":
+        return None
+
+    claims = token_claims.get(token)
+    if claims is None:
+        claims = _decode_token(token)
+        if claims is None:
             return None
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload.get("sub")
+        exp = claims.get("exp")
+        token_claims.set(token, claims, ttl=exp - time.time() if exp else None)
+    elif claims.get("exp") and claims["exp"] <= time.time():
+        token_claims.pop(token)
+        return None
+    return claims.get("sub")
+
+def _decode_token(token: str) -> Optional[dict]:
+    # jose (and cryptography behind it) loads on the first authenticated request
+    from jose import jwt
+
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except Exception:
         return None
 
-@router.get("/")
-async def list_all(username: Optional[str] = Depends(get_username_from_token)):
-    # return songs and whether they're locked for this user
-    async with engine.connect() as conn:
-        result = await conn.execute(select(Song))
-        songs = result.scalars().all()
+PAGE_SIZE = 50
 
-    # determine unlocked per user (if user is None -> guest)
-    unlocked_song_ids = set()
-    if username:
-        res = await engine.execute(select(User).where(User.username == username))
-        user = res.scalars().first()
-        if user:
-            res2 = await engine.execute(select(UserUnlock).where(UserUnlock.user_id == user.id))
-            unlocks = res2.scalars().all()
-            unlocked_song_ids = {u.song_id for u in unlocks}
+@router.get("/")
+async def list_all(
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=200),
+    q: Optional[str] = None,
+    author: Optional[str] = None,
+    locked: Optional[bool] = None,
+    username: Optional[str] = Depends(get_username_from_token),
+):
+    # songs (newest first) and whether they're locked for this user (guests:
+    # default_locked songs are locked), as a bare list of all of them.
+    # ?cursor= (empty for the first page) opts into pages of `limit` songs
+    # instead: {"items": [...], "next": cursor}, `next` going in the next ?cursor=
+    paginated = cursor is not None
+    if paginated and limit is None:
+        limit = PAGE_SIZE
+    try:
+        after = crud.decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+    rows = await crud.list_songs_for_user(
+        username, limit, after=after, query=q, author=author, locked=locked
+    )
 
     out = []
-    for s in songs:
-        # locked if default_locked True and not in user's unlocks
-        locked = bool(s.default_locked and (s.id not in unlocked_song_ids))
+    for s, is_locked in rows:
         out.append({
             "song_id": s.song_id,
             "title": s.title,
-            "locked": locked,
+            "locked": bool(is_locked),
             "default_locked": s.default_locked,
-            "path": s.path if not locked else None
+            "path": s.path if not is_locked else None
         })
-    return out
+    if not paginated:
+        return out
+    next_cursor = None
+    if len(rows) == limit:
+        last = rows[-1][0]
+        next_cursor = crud.encode_cursor(last.created_at, last.id)
+    return {"items": out, "next": next_cursor}
 
 @router.post("/upload")
-async def upload_chart(file: UploadFile = File(...), title: str = "", default_locked: bool = False, username: Optional[str] = Depends(get_username_from_token)):
+async def upload_chart(request: Request, file: UploadFile = File(...), title: str = "", default_locked: bool = False, username: Optional[str] = Depends(get_username_from_token)):
     # require an authenticated admin to upload (simple check)
     if not username:
         raise HTTPException(401, "Auth required to upload")
 
     # quick check user is admin
-    res = await engine.execute(select(User).where(User.username == username))
-    user = res.scalars().first()
+    user = await crud.get_cached_user(username)
     if not user or not user.is_admin:
         raise HTTPException(403, "Admin required to upload")
 
-    content = await file.read()
-    uid, path = save_chart_file(file.filename, content)
-    song_id = uid  # or derive from filename
-    # register in DB
-    await crud.create_song_sync(song_id=song_id, title=title or file.filename, path=path, default_locked=default_locked)
-    # optionally call compile logic in background (not shown)
-    return {"song_id": song_id, "title": title or file.filename}
+    # copied in chunks off the event loop, validated, then moved into place
+    try:
+        stored = await request.app.run_blocking(store_chart_upload, file.file, pool="io")
+    except UploadTooLarge as e:
+        raise HTTPException(413, str(e))
+    except InvalidChart as e:
+        raise HTTPException(400, str(e))
+    song_id = stored.uid  # or derive from filename
+    # register in DB and queue it for the Sonolus catalog (compiled in the background)
+    job = await request.app.compile_and_register(song_id, stored.path, title or file.filename, default_locked)
+    return {
+        "song_id": song_id,
+        "title": title or file.filename,
+        "sha1": stored.sha1,
+        "size": stored.size,
+        "ingest": {"job_id": job.id, "status": job.status},
+    }
 
 @router.post("/{song_id}/unlock")
 async def unlock_song(song_id: str, username: Optional[str] = Depends(get_username_from_token)):
     if not username:
         raise HTTPException(401, "Auth required")
-    # find user and song
-    res = await engine.execute(select(User).where(User.username == username))
-    user = res.scalars().first()
-    if not user:
-        raise HTTPException(404, "User not found")
-
-    res2 = await engine.execute(select(Song).where(Song.song_id == song_id))
-    song = res2.scalars().first()
-    if not song:
+    # idempotent: inserts the unlock unless it's already there
+    unlocked = await crud.unlock_song(username, song_id)
+    if unlocked is None:
+        if not await crud.get_cached_user(username):
+            raise HTTPException(404, "User not found")
         raise HTTPException(404, "Song not found")
-
-    # check unlock already exists
-    res3 = await engine.execute(select(UserUnlock).where(UserUnlock.user_id == user.id, UserUnlock.song_id == song.id))
-    existing = res3.scalars().first()
-    if existing:
+    if not unlocked:
         return {"ok": True, "message": "already unlocked"}
 
-    # create unlock
-    async with engine.begin() as conn:
-        unlock = UserUnlock(user_id=user.id, song_id=song.id)
-        conn.add(unlock)
-
     return {"ok": True}
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import JSONResponse
-import json, time, os, httpx
+import json, time, os
 from utils.sonolus_sig import verify_sonolus_signature, is_recent
 
 router = APIRouter()
@@ -25,6 +25,8 @@ async def authenticate_external(request: Request):
 
     # Call chart-backend to mint website session (internal call)
     backend_url = os.getenv("CHART_BACKEND_URL", "http://127.0.0.1:8080")
+    import httpx
+
     async with httpx.AsyncClient(timeout=5.0) as client:
         r = await client.post(
             f"{backend_url}/api/accounts/session/external/complete",
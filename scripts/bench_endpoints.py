@@ -0,0 +1,306 @@
+"""
+Latency/throughput benchmark for the Sonolus endpoints.
+
+Copies the server into a scratch workspace, fills it with a synthetic
+corpus (scripts/generate_synthetic_levels.py) and drives the real ASGI
+app in-process over httpx's ASGI transport, so the numbers cover routing,
+middleware, compiles and repository reads but not the network.
+
+Scenarios: /sonolus/info, level info (sections), the item detail route,
+the level list and its keyword search (/sonolus/levels/list), /api/charts
+(first page, cursor pages and title search, over a songs table seeded with
+one song per level) and /sonolus/repository/{hash} with a cold and a warm
+file cache. A 404 anywhere fails the run: every route benchmarked exists.
+
+Results (throughput, p50/p95/p99 per scenario) are written as JSON. Pass
+--baseline with an earlier result file to fail (exit 1) when any scenario
+got slower than --threshold allows.
+
+requirements:
+- httpx
+- everything in requirements.txt
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parent.parent
+IGNORE = shutil.ignore_patterns(
+    ".git",
+    "__pycache__",
+    "*.zip",
+    "sonolus.db",
+    "compiled_static_levels.json",
+    "dynamic_charts",
+    "requests.jsonl",
+)
+
+
+# every level ships its preview and stage, so compiling never writes into
+# the zips and a reused workspace compiles the same way every run
+CORPUS_ARGS = ["--duration", "60:150", "--preview-ratio", "1", "--stage-ratio", "1"]
+
+
+def prepare_workspace(
+    workspace: Path, levels: int, seed: str, corpus_args: list = CORPUS_ARGS
+):
+    """Copy the server and generate `levels` synthetic levels, unless present."""
+    if not (workspace / "app.py").exists():
+        shutil.copytree(REPO, workspace, ignore=IGNORE, dirs_exist_ok=True)
+    level_dir = workspace / "levels" / "chcy-pjsekai-extended"
+    existing = len(list(level_dir.glob("*.zip"))) if level_dir.exists() else 0
+    if existing < levels:
+        subprocess.run(
+            [
+                sys.executable,
+                str(REPO / "scripts" / "generate_synthetic_levels.py"),
+                str(levels - existing),
+                "--start",
+                str(existing),
+                "--seed",
+                seed,
+                "--levels-dir",
+                str(workspace / "levels"),
+                *corpus_args,
+            ],
+            cwd=workspace,
+            check=True,
+        )
+    # start from an uncompiled catalog
+    (workspace / "levels" / "compiled_static_levels.json").unlink(missing_ok=True)
+
+
+def percentile(latencies: list, q: float) -> float:
+    index = min(len(latencies) - 1, max(0, round(q / 100 * len(latencies)) - 1))
+    return latencies[index]
+
+
+async def run_scenario(client, paths: list, concurrency: int) -> dict:
+    """GETs every path once, `concurrency` at a time."""
+    latencies = []
+    statuses = {}
+    queue = iter(paths)
+
+    async def worker():
+        for path in queue:
+            started_at = time.perf_counter()
+            response = await client.get(path)
+            latencies.append(time.perf_counter() - started_at)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started_at
+
+    if statuses.get(404):
+        raise SystemExit(f"{statuses[404]} requests like {paths[0]} returned 404")
+    latencies.sort()
+    return {
+        "requests": len(paths),
+        "errors": sum(n for code, n in statuses.items() if code >= 400),
+        "throughput": len(paths) / elapsed,
+        "mean": sum(latencies) / len(latencies),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+    }
+
+
+async def seed_songs(count: int):
+    """/api/charts rows (kept on reruns in a reused workspace), every third locked."""
+    import crud
+
+    await crud.bulk_upsert_songs(
+        {
+            "song_id": f"synth-{index:06d}",
+            "title": f"Synthetic Song {index}",
+            "path": f"levels/chcy-pjsekai-extended/synth-{index:06d}.zip",
+            "default_locked": index % 3 == 0,
+        }
+        for index in range(count)
+    )
+
+
+async def chart_cursors(client, pages: int) -> list:
+    """?cursor= values of the first `pages` pages of /api/charts."""
+    cursors = [""]
+    while len(cursors) < pages:
+        response = await client.get(f"/api/charts/?cursor={cursors[-1]}")
+        cursor = response.json()["next"]
+        if cursor is None:
+            break
+        cursors.append(cursor)
+    return cursors
+
+
+async def bench(args) -> dict:
+    import httpx
+
+    import app as app_module
+    from helpers.data_compilers import compile_static_levels_list, get_warm
+    from helpers.repository_map import repo
+
+    app = app_module.app
+    # the seeded songs point at static levels: don't compile them as uploads
+    app_module.config["server"]["enable-dynamic"] = False
+    await app_module.startup_event()
+    await seed_songs(args.levels)
+    rng = random.Random(args.seed)
+    results = {}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as client:
+        # the first catalog request pays for compiling every level
+        results["levels_info_cold"] = await run_scenario(
+            client, ["/sonolus/levels/info/"], 1
+        )
+        levels = get_warm(compile_static_levels_list) or []
+        names = [level["name"] for level in levels]
+        if not names:
+            raise SystemExit("No levels compiled, is the workspace corpus valid?")
+
+        def sample(make_path):
+            return [make_path() for _ in range(args.requests)]
+
+        pages = -(-len(names) // app.get_items_per_page("levels"))
+        cursors = await chart_cursors(client, 20)
+        scenarios = {
+            "info": sample(lambda: "/sonolus/info/"),
+            "levels_info": sample(lambda: "/sonolus/levels/info/"),
+            "level_detail": sample(
+                lambda: f"/sonolus/{rng.choice(names)}/?item_type=levels"
+            ),
+            "levels_list": sample(
+                lambda: f"/sonolus/levels/list/?page={rng.randrange(pages)}"
+            ),
+            "levels_search": sample(
+                lambda: f"/sonolus/levels/list/?keywords=Song+{rng.randrange(len(names))}"
+            ),
+            "charts_list": sample(lambda: "/api/charts/?cursor="),
+            "charts_pages": sample(lambda: f"/api/charts/?cursor={rng.choice(cursors)}"),
+            "charts_search": sample(
+                lambda: f"/api/charts/?cursor=&q=Song+{rng.randrange(len(names))}"
+            ),
+        }
+        for name, paths in scenarios.items():
+            results[name] = await run_scenario(client, paths, args.concurrency)
+
+        # repository: every small resource once with an empty file cache,
+        # then the same set again once it's all cached
+        hashes = []
+        for level in levels:
+            for key in ("cover", "data", "preview"):
+                if key in level:
+                    hashes.append(level[key]["hash"])
+        hashes = hashes[: args.requests]
+        repo.clear_cache()
+        results["repository_cold"] = await run_scenario(
+            client, [f"/sonolus/repository/{h}/" for h in hashes], args.concurrency
+        )
+        results["repository_warm"] = await run_scenario(
+            client, [f"/sonolus/repository/{h}/" for h in hashes], args.concurrency
+        )
+
+    return {
+        "meta": {
+            "levels": len(names),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "scenarios": results,
+    }
+
+
+def compare(result: dict, baseline: dict, threshold: float) -> list:
+    """Scenarios whose p95 grew or throughput dropped by more than threshold."""
+    regressions = []
+    for name, current in result["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        if current["p95"] > previous["p95"] * (1 + threshold):
+            regressions.append(
+                f"{name}: p95 {previous['p95'] * 1000:.2f}ms -> {current['p95'] * 1000:.2f}ms"
+            )
+        if current["throughput"] < previous["throughput"] * (1 - threshold):
+            regressions.append(
+                f"{name}: throughput {previous['throughput']:,.0f} -> "
+                f"{current['throughput']:,.0f} req/s"
+            )
+    return regressions
+
+
+def print_table(result: dict):
+    print(f"{'scenario':<18} {'req/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, r in result["scenarios"].items():
+        errors = f"  ({r['errors']} errors)" if r["errors"] else ""
+        print(
+            f"{name:<18} {r['throughput']:>10,.0f} {r['p50'] * 1000:>9.2f} "
+            f"{r['p95'] * 1000:>9.2f} {r['p99'] * 1000:>9.2f}{errors}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Sonolus endpoints.")
+    parser.add_argument("--levels", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seed", default="0")
+    parser.add_argument(
+        "--workspace",
+        type=Path,
+        help="Reuse this directory (and its generated corpus) between runs",
+    )
+    parser.add_argument("--output", type=Path, default=Path("bench_results.json"))
+    parser.add_argument("--baseline", type=Path)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Allowed slowdown vs. the baseline (0.2 = 20%%)",
+    )
+    args = parser.parse_args()
+
+    output = args.output.resolve()
+    baseline = json.loads(args.baseline.read_text()) if args.baseline else None
+    workspace = args.workspace or Path(tempfile.mkdtemp(prefix="sonolus-bench-"))
+    workspace = workspace.resolve()
+    prepare_workspace(workspace, args.levels, args.seed)
+
+    os.chdir(workspace)
+    sys.path[:0] = [str(workspace), str(workspace / "helpers")]
+    result = asyncio.run(bench(args))
+    if not args.workspace:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    output.write_text(json.dumps(result, indent=2))
+    print_table(result)
+    print(f"results written to {output}")
+
+    if baseline:
+        regressions = compare(result, baseline, args.threshold)
+        if regressions:
+            print(f"\nregressions over {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"- {line}")
+            raise SystemExit(1)
+        print(f"\nno regressions over {args.threshold:.0%} vs. {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
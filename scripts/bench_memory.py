@@ -0,0 +1,240 @@
+"""
+Memory footprint of the level catalog as it grows.
+
+For each catalog size (default 1k/10k/100k synthetic levels) a fresh
+process compiles the catalog with tracemalloc on and reports:
+- RSS and traced bytes before/after compiling, and per level
+- a breakdown of the catalog by structure (LevelItem dicts, embedded
+  engines, SRLs, repository entries, stats, sections, resource paths),
+  each byte counted once, in the first structure that reaches it
+- the allocation sites that grew the most
+- the same again for a warm start, i.e. loading compiled_static_levels.json
+
+Levels are tiny (1s of music, 64px jackets): what's measured is what the
+server keeps in memory per level, which doesn't depend on file sizes.
+
+--budget fails the run (exit 1) if any size uses more traced bytes per
+level than allowed, so the number can be enforced over time.
+
+requirements:
+- everything in requirements.txt
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from bench_endpoints import prepare_workspace
+
+CORPUS_ARGS = [
+    "--duration",
+    "1:1",
+    "--notes",
+    "50:800",
+    "--kbps",
+    "128",
+    "--jacket-size",
+    "64",
+    "--stage-size",
+    "64",
+    "--preview-ratio",
+    "1",
+    "--stage-ratio",
+    "1",
+]
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+
+        # peak, not current, but the best we have off Linux (KiB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def deep_size(obj, seen: set) -> int:
+    """sys.getsizeof over everything reachable through containers, once."""
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)) or type(obj).__name__ == "deque":
+            stack.extend(obj)
+        elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+            stack.append(obj.__dict__)
+    return size
+
+
+def iter_srls(obj):
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, dict):
+            if obj.keys() == {"hash", "url"}:
+                yield obj
+            else:
+                stack.extend(obj.values())
+        elif isinstance(obj, list):
+            stack.extend(obj)
+
+
+def breakdown(dc, levels: list) -> dict:
+    from helpers.repository_map import repo
+    from helpers.sections import level_sections
+
+    seen = set()
+    parts = {}
+    # engines first: shared engine dicts show up once, per-level copies N times
+    parts["engines (embedded in levels)"] = sum(
+        deep_size(level["engine"], seen) for level in levels
+    )
+    parts["SRLs in levels"] = sum(
+        deep_size(srl, seen) for level in levels for srl in iter_srls(level)
+    )
+    parts["LevelItem dicts (rest)"] = deep_size(levels, seen)
+    parts["level stats"] = deep_size(dc.cached_static_level_stats, seen)
+    parts["resource paths"] = deep_size(dc.cached_static_level_resource_paths, seen)
+    parts["repository entries"] = deep_size(repo._map, seen)
+    parts["level sections"] = deep_size(level_sections, seen)
+    parts["compiled_static_levels.json (startup copy)"] = deep_size(
+        dc.static_levels_startup, seen
+    )
+    return parts
+
+
+def measure(mode: str) -> dict:
+    """Runs inside the workspace, in a fresh process."""
+    sys.path[:0] = [os.getcwd(), os.path.join(os.getcwd(), "helpers")]
+    # import everything data_compilers needs first, so code objects don't
+    # count as catalog memory
+    import helpers.datastructs, helpers.executors, helpers.level_assets
+    import helpers.metrics, helpers.repository_map, helpers.sections
+    import helpers.server_stats, helpers.sha1
+
+    rss_before = rss_bytes()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+
+    started_at = time.perf_counter()
+    import helpers.data_compilers as dc
+
+    levels = dc.compile_static_levels_list("https://bench")
+    elapsed = time.perf_counter() - started_at
+
+    after = tracemalloc.take_snapshot()
+    traced, _ = tracemalloc.get_traced_memory()
+    count = max(len(levels), 1)
+    parts = breakdown(dc, levels)
+    top = [
+        {
+            "site": str(stat.traceback[0]),
+            "bytes": stat.size_diff,
+            "perLevel": stat.size_diff / count,
+        }
+        for stat in after.compare_to(before, "lineno")[:15]
+    ]
+    return {
+        "mode": mode,
+        "levels": len(levels),
+        "seconds": elapsed,
+        "rssBytes": rss_bytes() - rss_before,
+        "tracedBytes": traced,
+        "tracedPerLevel": traced / count,
+        "structures": {
+            name: {"bytes": size, "perLevel": size / count}
+            for name, size in parts.items()
+        },
+        "topAllocations": top,
+    }
+
+
+def run_measurement(workspace: Path, mode: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, __file__, "--measure", mode],
+        cwd=workspace,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def print_result(result: dict):
+    print(
+        f"\n{result['levels']:,} levels, {result['mode']} ({result['seconds']:.1f}s): "
+        f"RSS +{result['rssBytes'] / 1024 / 1024:,.1f} MiB, "
+        f"traced {result['tracedBytes'] / 1024 / 1024:,.1f} MiB "
+        f"({result['tracedPerLevel']:,.0f} B/level)"
+    )
+    for name, part in result["structures"].items():
+        print(f"  {name:<45} {part['perLevel']:>10,.0f} B/level")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure catalog memory footprint.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--seed", default="0")
+    parser.add_argument(
+        "--workspace",
+        type=Path,
+        help="Reuse this directory (and its generated corpus) between runs",
+    )
+    parser.add_argument("--output", type=Path, default=Path("bench_memory.json"))
+    parser.add_argument(
+        "--budget", type=float, help="Max traced bytes per level, for any size"
+    )
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure)))
+        return
+
+    output = args.output.resolve()
+    results = []
+    for size in sorted(args.sizes):
+        # one workspace per size, so each compiles exactly `size` levels
+        base = args.workspace or Path(tempfile.mkdtemp(prefix="sonolus-mem-"))
+        workspace = (base / str(size)).resolve()
+        prepare_workspace(workspace, size, args.seed, CORPUS_ARGS)
+        for mode in ("compile", "warm start"):
+            result = run_measurement(workspace, mode)
+            print_result(result)
+            results.append(result)
+        if not args.workspace:
+            shutil.rmtree(base, ignore_errors=True)
+
+    output.write_text(json.dumps(results, indent=2))
+    print(f"\nresults written to {output}")
+
+    if args.budget:
+        over = [r for r in results if r["tracedPerLevel"] > args.budget]
+        for r in over:
+            print(
+                f"over budget: {r['levels']:,} levels ({r['mode']}) "
+                f"{r['tracedPerLevel']:,.0f} > {args.budget:,.0f} B/level"
+            )
+        if over:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Requests/second before and after replacing the two BaseHTTPMiddleware layers
+(Sonolus-Version/localization + the https Location rewrite) with the pure ASGI
+helpers.middleware.SonolusMiddleware.
+
+Runs in-process over httpx's ASGI transport, so the numbers only compare
+middleware overhead, not real network throughput.
+
+requirements:
+- fastapi
+- httpx
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import RedirectResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from helpers.middleware import SonolusMiddleware
+
+VERSION = "1.0.0"
+
+
+def add_routes(app: FastAPI):
+    @app.get("/sonolus/info")
+    async def info(request: Request):
+        return {"title": "bench", "localization": request.state.localization}
+
+    @app.get("/redirect")
+    async def redirect():
+        return RedirectResponse("http://testserver/sonolus/info")
+
+
+def before_app() -> FastAPI:
+    class OldSonolusMiddleware(BaseHTTPMiddleware):
+        async def dispatch(self, request: Request, call_next):
+            request.state.localization = request.query_params.get(
+                "localization", "en"
+            )
+            response = await call_next(request)
+            response.headers["Sonolus-Version"] = VERSION
+            return response
+
+    app = FastAPI()
+    add_routes(app)
+    app.add_middleware(OldSonolusMiddleware)
+
+    @app.middleware("http")
+    async def force_https_redirect(request, call_next):
+        response = await call_next(request)
+        if response.headers.get("Location"):
+            response.headers["Location"] = response.headers.get("Location").replace(
+                "http://", "https://", 1
+            )
+        return response
+
+    return app
+
+
+def after_app() -> FastAPI:
+    app = FastAPI()
+    add_routes(app)
+    app.add_middleware(SonolusMiddleware, version=VERSION, force_https=True)
+    return app
+
+
+async def run(app: FastAPI, requests: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        # sanity check both stacks behave the same
+        r = await c.get("/sonolus/info?localization=ja")
+        assert r.headers["sonolus-version"] == VERSION, r.headers
+        assert r.json()["localization"] == "ja"
+        r = await c.get("/redirect")
+        assert r.headers["location"].startswith("https://"), r.headers
+
+        queue = iter(range(requests))
+
+        async def worker():
+            for _ in queue:
+                await c.get("/sonolus/info")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return requests / (time.perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark Sonolus middleware.")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    before = await run(before_app(), args.requests, args.concurrency)
+    after = await run(after_app(), args.requests, args.concurrency)
+    print(f"BaseHTTPMiddleware x2: {before:,.0f} req/s")
+    print(f"pure ASGI middleware:  {after:,.0f} req/s ({after / before:.2f}x)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,122 @@
+"""
+Benchmark MP3 duration/bitrate extraction over a synthetic corpus of level zips.
+
+Compares the header-only scan used by the level compiler (helpers/mp3_info.py)
+against walking every frame of the file.
+
+requirements:
+- Python 3.8+
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from helpers.mp3_info import iter_frames, read_mp3_info
+
+_BITRATE_INDEX = {32: 1, 40: 2, 48: 3, 56: 4, 64: 5, 80: 6, 96: 7, 112: 8, 128: 9}
+_BITRATE_INDEX.update({160: 10, 192: 11, 224: 12, 256: 13, 320: 14})
+
+
+def mp3_frame(kbps: int, payload: bytes = b"") -> bytes:
+    """One MPEG-1 Layer III frame, 44.1kHz joint stereo."""
+    header = bytes([0xFF, 0xFB, _BITRATE_INDEX[kbps] << 4, 0x44])
+    length = 144 * kbps * 1000 // 44100
+    body = payload[: length - 4]
+    return header + body + bytes(length - 4 - len(body))
+
+
+def synthetic_mp3(seconds: float, kbps: int = 192, kind: str = "cbr", id3: int = 0):
+    """
+    kind: "cbr" (no VBR header), "xing" (VBR with a Xing frame),
+    "vbri" (VBR with a Fraunhofer VBRI frame)
+    """
+    frames_count = int(seconds * 44100 / 1152)
+    if kind == "cbr":
+        frames = [mp3_frame(kbps) for _ in range(frames_count)]
+    else:
+        choices = [128, 160, 192, 256, 320]
+        frames = [mp3_frame(random.choice(choices)) for _ in range(frames_count)]
+    audio_bytes = sum(len(frame) for frame in frames)
+    if kind == "xing":
+        tag = b"Xing" + (3).to_bytes(4, "big")
+        tag += frames_count.to_bytes(4, "big") + audio_bytes.to_bytes(4, "big")
+        frames.insert(0, mp3_frame(128, bytes(32) + tag))
+    elif kind == "vbri":
+        tag = b"VBRI" + bytes(6) + audio_bytes.to_bytes(4, "big")
+        tag += frames_count.to_bytes(4, "big")
+        frames.insert(0, mp3_frame(128, bytes(32) + tag))
+    data = b"".join(frames)
+    if id3:
+        size = bytes((id3 >> shift) & 0x7F for shift in (21, 14, 7, 0))
+        data = b"ID3\x04\x00\x00" + size + bytes(id3) + data
+    return data
+
+
+def build_corpus(root: Path, count: int, seconds: float):
+    kinds = ["cbr", "xing", "vbri"]
+    paths = []
+    for i in range(count):
+        kind = kinds[i % len(kinds)]
+        id3 = random.choice([0, 0, 1024, 64 * 1024])
+        path = root / f"bench-{i}.zip"
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("music.mp3", synthetic_mp3(seconds, kind=kind, id3=id3))
+        paths.append(path)
+    return paths
+
+
+def header_scan(path: Path):
+    with zipfile.ZipFile(path) as zf:
+        info = zf.getinfo("music.mp3")
+        with zf.open(info) as f:
+            return read_mp3_info(f, info.file_size)
+
+
+def full_scan(path: Path):
+    with zipfile.ZipFile(path) as zf:
+        data = zf.read("music.mp3")
+    seconds = 0.0
+    for _, header in iter_frames(data):
+        seconds += header.samples / header.sample_rate
+    return seconds
+
+
+def bench(name, func, paths):
+    start = time.perf_counter()
+    for path in paths:
+        func(path)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:>12}: {elapsed:.3f}s total, "
+        f"{elapsed / len(paths) * 1000:.3f}ms per level"
+    )
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MP3 header scanning.")
+    parser.add_argument("--levels", type=int, default=300)
+    parser.add_argument("--seconds", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = build_corpus(Path(tmp), args.levels, args.seconds)
+        for path in paths[:3]:
+            info = header_scan(path)
+            print(f"{path.name}: {info} (frame walk: {full_scan(path):.3f}s)")
+        header = bench("header scan", header_scan, paths)
+        full = bench("frame walk", full_scan, paths)
+        print(f"header scan is {full / header:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
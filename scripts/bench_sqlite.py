@@ -0,0 +1,162 @@
+"""
+Concurrent read/write benchmark for sonolus.db.
+
+Runs the same mixed workload against a scratch database once per pragma
+profile, each in a fresh process:
+- "default": SQLite's own pragmas (rollback journal, synchronous=FULL)
+- "tuned": db.SQLITE_PRAGMAS (WAL, synchronous=NORMAL, mmap, cache, ...)
+
+Readers look songs up by song_id and load a user's unlocks, writers add
+unlocks and songs, all through the app's async engine and crud, for
+--duration seconds. Reported per profile: reads/writes per second,
+p50/p95/p99 and how many operations failed (e.g. "database is locked").
+
+requirements:
+- everything in requirements.txt
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bench_endpoints import REPO, percentile
+
+PROFILES = ["default", "tuned"]
+
+
+async def workload(args) -> dict:
+    import crud, db
+    from models import User, UserUnlock
+    from sqlmodel import select
+
+    await db.init_db()
+    await crud.bulk_upsert_songs(
+        {"song_id": f"song-{i}", "title": f"Song {i}", "path": f"dynamic/{i}.zip"}
+        for i in range(args.songs)
+    )
+    async with db.get_session() as sess:
+        sess.add_all(User(username=f"user-{i}", hashed_password="x") for i in range(args.users))
+        await sess.commit()
+
+    rng = random.Random(0)
+    deadline = time.perf_counter() + args.duration
+    latencies = {"read": [], "write": []}
+    errors = {"read": 0, "write": 0}
+
+    async def timed(kind: str, operation):
+        started_at = time.perf_counter()
+        try:
+            await operation()
+        except Exception:
+            errors[kind] += 1
+        else:
+            latencies[kind].append(time.perf_counter() - started_at)
+
+    async def read():
+        await crud.get_song_by_songid(f"song-{rng.randrange(args.songs)}")
+        async with db.get_session() as sess:
+            user_id = rng.randrange(args.users) + 1
+            await sess.exec(select(UserUnlock).where(UserUnlock.user_id == user_id))
+
+    async def write():
+        if rng.random() < 0.1:
+            await crud.create_song(f"new-{rng.getrandbits(64):x}", "New", "dynamic/new.zip")
+            return
+        async with db.get_session() as sess:
+            sess.add(
+                UserUnlock(
+                    user_id=rng.randrange(args.users) + 1,
+                    song_id=rng.randrange(args.songs) + 1,
+                )
+            )
+            await sess.commit()
+
+    async def worker(kind: str, operation):
+        while time.perf_counter() < deadline:
+            await timed(kind, operation)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(
+        *(worker("read", read) for _ in range(args.readers)),
+        *(worker("write", write) for _ in range(args.writers)),
+    )
+    elapsed = time.perf_counter() - started_at
+    await db.engine.dispose()
+
+    result = {}
+    for kind, values in latencies.items():
+        values.sort()
+        result[kind] = {
+            "ops": len(values),
+            "errors": errors[kind],
+            "throughput": len(values) / elapsed,
+            "p50": percentile(values, 50) if values else None,
+            "p95": percentile(values, 95) if values else None,
+            "p99": percentile(values, 99) if values else None,
+        }
+    return result
+
+
+def run_profile(profile: str, args) -> dict:
+    with tempfile.TemporaryDirectory(prefix="sonolus-sqlite-") as directory:
+        env = dict(os.environ, DATABASE_URL=f"sqlite+aiosqlite:///{directory}/bench.db")
+        output = subprocess.run(
+            [sys.executable, __file__, *sys.argv[1:], "--run", profile],
+            cwd=REPO,
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def print_table(results: dict):
+    print(f"{'profile':<10} {'op':<6} {'ops/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for profile, result in results.items():
+        for kind, r in result.items():
+            if not r["ops"]:
+                print(f"{profile:<10} {kind:<6} {0:>9} {'-':>9} {'-':>9} {'-':>9} {r['errors']:>7}")
+                continue
+            print(
+                f"{profile:<10} {kind:<6} {r['throughput']:>9,.0f} {r['p50'] * 1000:>9.2f} "
+                f"{r['p95'] * 1000:>9.2f} {r['p99'] * 1000:>9.2f} {r['errors']:>7}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sonolus.db under load.")
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per profile")
+    parser.add_argument("--songs", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--profiles", nargs="+", default=PROFILES, choices=PROFILES)
+    parser.add_argument("--output", type=Path, default=Path("bench_sqlite.json"))
+    parser.add_argument("--run", choices=PROFILES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        sys.path.insert(0, str(REPO))
+        import db
+
+        if args.run == "default":
+            db.sqlite_pragmas.clear()
+        print(json.dumps(asyncio.run(workload(args))))
+        return
+
+    results = {profile: run_profile(profile, args) for profile in args.profiles}
+    args.output.write_text(json.dumps(results, indent=2))
+    print_table(results)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
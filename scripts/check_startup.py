@@ -0,0 +1,205 @@
+"""
+Cold-start check.
+
+In fresh processes, from the repo root:
+- `python -X importtime -c "import app"`: fails if any of LAZY_MODULES got
+  imported (they're meant to load on first use), or if the import got
+  slower than the committed profile (scripts/import_profile.json) by more
+  than --threshold. Modules the interpreter loads by itself (those of
+  `python -c pass`, e.g. site and .pth imports) aren't part of the profile.
+- time-to-first-byte of /sonolus/info: import app, run startup, answer
+  the first request (in-process, no network). Fails over --ttfb-budget.
+  Startup runs against a temporary copy of sonolus.db, never the real one.
+
+--update rewrites scripts/import_profile.json from this run, e.g. after
+adding a dependency on purpose.
+
+requirements:
+- httpx
+- everything in requirements.txt
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parent.parent
+PROFILE = Path(__file__).resolve().parent / "import_profile.json"
+
+# image, crypto and auth libraries: load on first use, never at import
+LAZY_MODULES = [
+    "PIL",
+    "pjsk_background_gen_PIL",
+    "jose",
+    "bcrypt",
+    "cryptography",
+    "httpx",
+]
+
+TTFB_SCRIPT = """
+import asyncio, json, os, time
+import httpx
+
+started_at = time.perf_counter()
+import app as app_module
+imported_at = time.perf_counter()
+
+
+async def main():
+    await app_module.startup_event()
+    ready_at = time.perf_counter()
+    transport = httpx.ASGITransport(app=app_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://check") as client:
+        response = await client.get("/sonolus/info/")
+    done_at = time.perf_counter()
+    print(json.dumps({
+        "status": response.status_code,
+        "import": imported_at - started_at,
+        "startup": ready_at - imported_at,
+        "firstRequest": done_at - ready_at,
+        "ttfb": done_at - started_at,
+    }), flush=True)
+
+
+asyncio.run(main())
+# don't wait for the executor pools and background tasks to wind down
+os._exit(0)
+"""
+
+
+def import_times(code: str) -> list:
+    """(cumulative microseconds, indented name) per -X importtime line."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=REPO,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stderr
+    times = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        times.append((int(cumulative), name))
+    return times
+
+
+def import_profile() -> dict:
+    """Import times (microseconds) from -X importtime, for `import app`."""
+    # what the interpreter imports before running anything
+    startup = {name.strip() for _, name in import_times("pass")}
+    modules = {}
+    direct = {}
+    for cumulative, name in import_times("import app"):
+        if name.strip() in startup:
+            continue
+        # two spaces of indent = imported by app itself
+        if name.startswith("   ") and not name.startswith("     "):
+            direct[name.strip()] = cumulative
+        modules[name.strip()] = cumulative
+    return {
+        "total": modules["app"],
+        "imports": dict(sorted(direct.items(), key=lambda item: -item[1])),
+        "modules": sorted(modules),
+    }
+
+
+def time_to_first_byte() -> dict:
+    # startup runs init_db (and queues ingest jobs): do that to a copy
+    with tempfile.TemporaryDirectory(prefix="sonolus-startup-") as directory:
+        database = Path(directory) / "sonolus.db"
+        if (REPO / "sonolus.db").exists():
+            shutil.copy(REPO / "sonolus.db", database)
+        env = dict(os.environ, DATABASE_URL=f"sqlite+aiosqlite:///{database}")
+        output = subprocess.run(
+            [sys.executable, "-c", TTFB_SCRIPT],
+            cwd=REPO,
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check cold-start import time.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.5,
+        help="Allowed import slowdown vs. the profile (0.5 = 50%%)",
+    )
+    parser.add_argument(
+        "--ttfb-budget", type=float, default=1.0, help="Seconds, import to response"
+    )
+    parser.add_argument("--update", action="store_true")
+    args = parser.parse_args()
+
+    failures = []
+    # best of three, import times are noisy
+    profile = min((import_profile() for _ in range(3)), key=lambda p: p["total"])
+    print(f"import app: {profile['total'] / 1000:,.0f} ms")
+    for name, took in list(profile["imports"].items())[:10]:
+        print(f"  {name:<30} {took / 1000:>8,.1f} ms")
+
+    eager = sorted(
+        {
+            module
+            for module in profile["modules"]
+            if module.split(".")[0] in LAZY_MODULES
+        }
+    )
+    if eager:
+        failures.append(f"imported at startup: {', '.join(eager)}")
+
+    if args.update:
+        PROFILE.write_text(
+            json.dumps({"total": profile["total"], "imports": profile["imports"]}, indent=2)
+            + "\n"
+        )
+        print(f"profile written to {PROFILE}")
+    elif PROFILE.exists():
+        committed = json.loads(PROFILE.read_text())
+        allowed = committed["total"] * (1 + args.threshold)
+        if profile["total"] > allowed:
+            failures.append(
+                f"import app took {profile['total'] / 1000:,.0f} ms, "
+                f"profile says {committed['total'] / 1000:,.0f} ms"
+            )
+            for name, took in profile["imports"].items():
+                before = committed["imports"].get(name, 0)
+                if took > before * (1 + args.threshold) + 5000:
+                    failures.append(
+                        f"  {name}: {before / 1000:,.1f} -> {took / 1000:,.1f} ms"
+                    )
+
+    ttfb = time_to_first_byte()
+    print(
+        f"/sonolus/info: {ttfb['status']} after {ttfb['ttfb'] * 1000:,.0f} ms "
+        f"(import {ttfb['import'] * 1000:,.0f}, startup {ttfb['startup'] * 1000:,.0f}, "
+        f"request {ttfb['firstRequest'] * 1000:,.0f})"
+    )
+    if ttfb["status"] != 200:
+        failures.append(f"/sonolus/info returned {ttfb['status']}")
+    if ttfb["ttfb"] > args.ttfb_budget:
+        failures.append(
+            f"time to first byte {ttfb['ttfb']:.2f}s > {args.ttfb_budget:.2f}s"
+        )
+
+    if failures:
+        print("\nfailed:")
+        for line in failures:
+            print(f"- {line}")
+        raise SystemExit(1)
+    print("\nok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Synthetic Level Corpus
+
+Writes N valid level zips into levels/{engine}/ so compile, list, search
+and repository paths can be benchmarked at 10k-100k levels without real
+charts. The output is deterministic for a given --seed and --count.
+
+Each zip has level.json, a gzipped level.data (PJSekai-style archetypes,
+so level stats and note counts are meaningful), jacket.png and a CBR
+music.mp3. music_pre.mp3 and stage.png/stage_thumbnail.png are included
+for a configurable share of levels; the rest get generated at compile
+time, like real uploads.
+
+Sizes are drawn log-uniformly from the given ranges (most levels small,
+with a long tail), and --jacket-reuse makes that share of levels pick
+their jacket from a small shared pool, which exercises hash dedup in the
+repository.
+
+requirements:
+- pillow
+"""
+
+import argparse
+import concurrent.futures
+import gzip
+import io
+import json
+import math
+import os
+import random
+import zipfile
+from pathlib import Path
+
+from PIL import Image
+
+NOTE_ARCHETYPES = [
+    ("NormalTapNote", 50),
+    ("CriticalTapNote", 8),
+    ("NormalFlickNote", 10),
+    ("NormalSlideStartNote", 8),
+    ("NormalSlideEndNote", 8),
+    ("NormalSlideTickNote", 12),
+    ("IgnoredSlideTickNote", 4),
+]
+
+_BITRATE_INDEX = {96: 7, 112: 8, 128: 9, 160: 10, 192: 11, 256: 13, 320: 14}
+# random bytes sliced into frame payloads, so music doesn't compress away
+_NOISE = random.Random(0).randbytes(1 << 20)
+
+
+def parse_range(value: str):
+    low, _, high = value.partition(":")
+    return float(low), float(high or low)
+
+
+def log_uniform(rng: random.Random, bounds) -> float:
+    low, high = bounds
+    if low == high:
+        return low
+    return math.exp(rng.uniform(math.log(low), math.log(high)))
+
+
+def synthetic_mp3(rng: random.Random, seconds: float, kbps: int) -> bytes:
+    """MPEG-1 Layer III, 44.1kHz, CBR frames filled with noise."""
+    header = bytes([0xFF, 0xFB, _BITRATE_INDEX[kbps] << 4, 0x44])
+    length = 144 * kbps * 1000 // 44100
+    frames = []
+    for _ in range(int(seconds * 44100 / 1152)):
+        offset = rng.randrange(len(_NOISE) - length)
+        frames.append(header + _NOISE[offset : offset + length - 4])
+    return b"".join(frames)
+
+
+def synthetic_level_data(rng: random.Random, notes: int, seconds: float) -> bytes:
+    bpm = rng.choice([120, 140, 150, 160, 180, 200])
+    entities = [
+        {"archetype": "Initialization", "data": []},
+        {"archetype": "Stage", "data": []},
+        {
+            "archetype": "#BPM_CHANGE",
+            "data": [{"name": "#BEAT", "value": 0}, {"name": "#BPM", "value": bpm}],
+        },
+    ]
+    beats = max(seconds * bpm / 60 - 8, 1)
+    names, weights = zip(*NOTE_ARCHETYPES)
+    for archetype in rng.choices(names, weights, k=notes):
+        entities.append(
+            {
+                "archetype": archetype,
+                "data": [
+                    {"name": "#BEAT", "value": round(4 + rng.random() * beats, 3)},
+                    {"name": "lane", "value": rng.randrange(-5, 6)},
+                    {"name": "size", "value": rng.choice([1, 1.5, 2])},
+                ],
+            }
+        )
+    level_data = {"bgmOffset": round(rng.uniform(-0.1, 0.1), 3), "entities": entities}
+    return gzip.compress(json.dumps(level_data).encode("utf8"), 6, mtime=0)
+
+
+def synthetic_png(seed: int, size: int) -> bytes:
+    """Smooth colour noise, so PNGs land near real jacket sizes."""
+    rng = random.Random(seed)
+    small = Image.frombytes("RGB", (16, 16), rng.randbytes(16 * 16 * 3))
+    buf = io.BytesIO()
+    small.resize((size, size), Image.BICUBIC).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def write_member(zip_file: zipfile.ZipFile, name: str, data: bytes):
+    # fixed timestamps keep the zips byte-identical across runs; only the
+    # JSON is worth deflating, everything else is already compressed
+    info = zipfile.ZipInfo(name, date_time=(2020, 1, 1, 0, 0, 0))
+    if name.endswith(".json"):
+        info.compress_type = zipfile.ZIP_DEFLATED
+    zip_file.writestr(info, data)
+
+
+def write_level(path: Path, index: int, args) -> int:
+    rng = random.Random(f"{args.seed}-{index}")
+    seconds = log_uniform(rng, args.duration)
+    notes = int(log_uniform(rng, args.notes))
+    kbps = rng.choice(args.kbps)
+
+    if rng.random() < args.jacket_reuse:
+        jacket_seed = f"{args.seed}-jacket-{rng.randrange(args.jacket_pool)}"
+    else:
+        jacket_seed = f"{args.seed}-jacket-level-{index}"
+    jacket = synthetic_png(jacket_seed, args.jacket_size)
+
+    level_json = {
+        "version": 1,
+        "title": f"Synthetic Song {index}",
+        "rating": rng.randint(5, 38),
+        "author": f"synth-author-{rng.randrange(200)}",
+        "artists": f"Synthetic Artist {rng.randrange(1000)}",
+    }
+    if rng.random() < 0.5:
+        level_json["description"] = f"Generated level #{index} ({notes} notes)."
+
+    with zipfile.ZipFile(path, "w") as zip_file:
+        write_member(zip_file, "level.json", json.dumps(level_json).encode("utf8"))
+        write_member(zip_file, "level.data", synthetic_level_data(rng, notes, seconds))
+        write_member(zip_file, "jacket.png", jacket)
+        write_member(zip_file, "music.mp3", synthetic_mp3(rng, seconds, kbps))
+        if rng.random() < args.preview_ratio:
+            preview = synthetic_mp3(rng, min(seconds, 20), kbps)
+            write_member(zip_file, "music_pre.mp3", preview)
+        if rng.random() < args.stage_ratio:
+            stage_seed = f"{jacket_seed}-stage"
+            stage = synthetic_png(stage_seed, args.stage_size)
+            thumbnail = synthetic_png(stage_seed, args.stage_size * 9 // 16)
+            write_member(zip_file, "stage.png", stage)
+            write_member(zip_file, "stage_thumbnail.png", thumbnail)
+    return path.stat().st_size
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic level zips for scale testing."
+    )
+    parser.add_argument("count", type=int, help="Number of levels to write")
+    parser.add_argument("--engine", default="chcy-pjsekai-extended")
+    parser.add_argument("--levels-dir", type=Path, default=Path("levels"))
+    parser.add_argument("--prefix", default="synth")
+    parser.add_argument("--start", type=int, default=0, help="First level index")
+    parser.add_argument("--seed", default="0")
+    parser.add_argument(
+        "--notes", type=parse_range, default="200:2500", help="MIN:MAX notes"
+    )
+    parser.add_argument(
+        "--duration", type=parse_range, default="90:240", help="MIN:MAX seconds"
+    )
+    parser.add_argument(
+        "--kbps", type=int, nargs="+", default=[128, 192, 256], choices=_BITRATE_INDEX
+    )
+    parser.add_argument("--jacket-size", type=int, default=512)
+    parser.add_argument("--stage-size", type=int, default=640)
+    parser.add_argument(
+        "--jacket-reuse",
+        type=float,
+        default=0.0,
+        help="Share of levels whose jacket comes from a shared pool",
+    )
+    parser.add_argument("--jacket-pool", type=int, default=32)
+    parser.add_argument(
+        "--preview-ratio",
+        type=float,
+        default=0.5,
+        help="Share of levels that ship music_pre.mp3",
+    )
+    parser.add_argument(
+        "--stage-ratio",
+        type=float,
+        default=1.0,
+        help="Share of levels that ship stage.png (the rest are rendered on compile)",
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    engine_dir = args.levels_dir / args.engine
+    engine_dir.mkdir(parents=True, exist_ok=True)
+    if not Path("files/engines", args.engine).is_dir():
+        print(f"[WARN] files/engines/{args.engine} doesn't exist, compile will skip these.")
+
+    indices = range(args.start, args.start + args.count)
+    total = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {
+            pool.submit(
+                write_level, engine_dir / f"{args.prefix}-{index:06d}.zip", index, args
+            ): index
+            for index in indices
+        }
+        for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            total += future.result()
+            if done % 1000 == 0 or done == args.count:
+                print(f"{done}/{args.count} levels, {total / 1024 / 1024:,.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,37 @@
 donotload = False
 
-from fastapi import APIRouter, Request
+import json
 
-from helpers.data_compilers import compile_banner, compile_static_levels_list
+from fastapi import APIRouter, Request, Response
+
+from helpers.data_compilers import compile_banner
 from helpers.datastructs import ServerInfoButton
+from helpers.server_stats import server_stats
 
-from typing import List
+from typing import Dict, List, Tuple
 
 router = APIRouter()
 
+# localization -> (server_stats.version, encoded response body)
+cached_info: Dict[str, Tuple[int, bytes]] = {}
+
 
 def setup():
     @router.get("/")
     async def main(request: Request):
-        # d = await request.app.run_blocking(compile_static_levels_list, request.app.base_url)
-        # extended_description = f"\nCurrently archiving {len(d):,} charts!"  # generated
-        extended_description = ""
+        localization = request.state.localization
+        hit = cached_info.get(localization)
+        if hit and hit[0] == server_stats.version:
+            return Response(content=hit[1], media_type="application/json")
+        version = server_stats.version
+
+        level_count = server_stats.count("levels")
+        extended_description = (
+            f"\nCurrently archiving {level_count:,} charts!" if level_count else ""
+        )
 
         # XXX https://wiki.sonolus.com/custom-server-specs/endpoints/get-sonolus-info
-        banner_srl = await request.app.run_blocking(compile_banner)
+        banner_srl = await request.app.run_cached(compile_banner)
         button_list = [
             "post",
             "level",
@@ -38,4 +51,8 @@ def setup():
         }
         if banner_srl:
             data["banner"] = banner_srl
-        return data
+        content = json.dumps(
+            data, ensure_ascii=False, separators=(",", ":")
+        ).encode("utf8")
+        cached_info[localization] = (version, content)
+        return Response(content=content, media_type="application/json")
@@ -4,6 +4,7 @@ from fastapi import APIRouter, Request, status, Response
 from fastapi import HTTPException
 
 from helpers.repository_map import repo
+from helpers.metrics import repository_bytes, repository_cache
 
 router = APIRouter()
 
@@ -11,7 +12,15 @@ router = APIRouter()
 def setup():
     @router.get("/{hash}/")
     async def main(request: Request, hash: str):
-        file_data = await request.app.run_blocking(repo.get_file, hash)
+        file_data = repo.get_cached(hash)
+        if file_data is None:
+            repository_cache.inc("miss")
+            file_data = await request.app.run_blocking(repo.get_file, hash)
+            if file_data:
+                repo.cache_file(hash, file_data)
+        else:
+            repository_cache.inc("hit")
         if file_data:
+            repository_bytes.inc(amount=len(file_data))
             return Response(content=file_data)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
@@ -25,16 +25,16 @@ def setup():
     @router.get("/")
     async def main(request: Request, item_type: ItemType, item_name: str):
         if item_type == "engines":
-            data = await request.app.run_blocking(
+            data = await request.app.run_cached(
                 compile_engines_list, request.app.base_url
             )
         elif item_type == "skins":
-            data = await request.app.run_blocking(
+            data = await request.app.run_cached(
                 compile_skins_list, request.app.base_url
             )
         elif item_type == "backgrounds":
             if item_name.startswith("levelbg-"):
-                level_data = await request.app.run_blocking(
+                level_data = await request.app.run_cached(
                     compile_static_levels_list, request.app.base_url
                 )
                 level_item = next(
@@ -44,32 +44,32 @@ def setup():
                 )
                 data = [level_item["useBackground"]["item"]]
             else:
-                data = await request.app.run_blocking(
+                data = await request.app.run_cached(
                     compile_backgrounds_list, request.app.base_url
                 )
         elif item_type == "effects":
-            data = await request.app.run_blocking(
+            data = await request.app.run_cached(
                 compile_effects_list, request.app.base_url
             )
         elif item_type == "particles":
-            data = await request.app.run_blocking(
+            data = await request.app.run_cached(
                 compile_particles_list, request.app.base_url
             )
         elif item_type == "posts":
-            data = await request.app.run_blocking(
+            data = await request.app.run_cached(
                 compile_static_posts_list, request.app.base_url
             )
             # maybe also grab non-static posts lol
         # elif item_type == "playlists":
-        #     data = await request.app.run_blocking(compile_playlists_list, request.app.base_url)
+        #     data = await request.app.run_cached(compile_playlists_list, request.app.base_url)
         elif item_type == "levels":
-            data = await request.app.run_blocking(
+            data = await request.app.run_cached(
                 compile_static_levels_list, request.app.base_url
             )
         # elif item_type == "replays":
-        #     data = await request.app.run_blocking(compile_replays_list, request.app.base_url)
+        #     data = await request.app.run_cached(compile_replays_list, request.app.base_url)
         # elif item_type == "rooms":
-        #     data = await request.app.run_blocking(compile_rooms_list, request.app.base_url)
+        #     data = await request.app.run_cached(compile_rooms_list, request.app.base_url)
         else:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -0,0 +1,83 @@
+donotload = False
+
+from fastapi import APIRouter, Request
+from fastapi import HTTPException, status
+
+from helpers.data_compilers import (
+    compile_banner,
+    compile_engines_list,
+    compile_backgrounds_list,
+    compile_effects_list,
+    compile_particles_list,
+    compile_skins_list,
+    compile_static_posts_list,
+    compile_static_levels_list,
+    static_levels_compiled,
+    sort_posts_by_newest,
+)
+from helpers.data_helpers import create_section
+from helpers.datastructs import ServerItem, ServerItemInfo, ServerItemSection
+from helpers.sections import SECTION_SIZE, level_sections
+from helpers.sonolus_typings import ItemType
+
+from typing import Dict, List, Tuple
+
+router = APIRouter()
+
+compilers = {
+    "engines": compile_engines_list,
+    "skins": compile_skins_list,
+    "backgrounds": compile_backgrounds_list,
+    "effects": compile_effects_list,
+    "particles": compile_particles_list,
+    "posts": compile_static_posts_list,
+}
+
+# item type -> (compiled list the sections were built from, sections)
+cached_sections: Dict[str, Tuple[List[ServerItem], List[ServerItemSection]]] = {}
+
+
+def build_sections(
+    item_type: ItemType, data: List[ServerItem]
+) -> List[ServerItemSection]:
+    if not data:
+        return []
+    if item_type == "posts":
+        return [
+            create_section(
+                "#NEWEST", item_type, sort_posts_by_newest(data)[:SECTION_SIZE]
+            )
+        ]
+    title = f"#{item_type.removesuffix('s').upper()}"
+    return [create_section(title, item_type, data[:SECTION_SIZE], icon=item_type[:-1])]
+
+
+def setup():
+    @router.get("/")
+    async def main(request: Request, item_type: ItemType):
+        if item_type == "levels":
+            if not static_levels_compiled():
+                await request.app.run_cached(
+                    compile_static_levels_list, request.app.base_url
+                )
+            sections = level_sections.sections()
+        elif item_type in compilers:
+            data = await request.app.run_cached(
+                compilers[item_type], request.app.base_url
+            )
+            hit = cached_sections.get(item_type)
+            if hit and hit[0] is data:
+                sections = hit[1]
+            else:
+                sections = build_sections(item_type, data)
+                cached_sections[item_type] = (data, sections)
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f'Item "{item_type}" not found.',
+            )
+        info: ServerItemInfo = {"searches": [], "sections": sections}
+        banner_srl = await request.app.run_cached(compile_banner)
+        if banner_srl:
+            info["banner"] = banner_srl
+        return info
@@ -0,0 +1,64 @@
+donotload = False
+
+from typing import Optional
+
+from fastapi import APIRouter, Request
+from fastapi import HTTPException, status
+
+from helpers.data_compilers import (
+    compile_engines_list,
+    compile_backgrounds_list,
+    compile_effects_list,
+    compile_particles_list,
+    compile_skins_list,
+    compile_static_posts_list,
+    compile_static_levels_list,
+)
+from helpers.datastructs import ServerItemList
+from helpers.sonolus_typings import ItemType
+
+router = APIRouter()
+
+compilers = {
+    "engines": compile_engines_list,
+    "skins": compile_skins_list,
+    "backgrounds": compile_backgrounds_list,
+    "effects": compile_effects_list,
+    "particles": compile_particles_list,
+    "posts": compile_static_posts_list,
+    "levels": compile_static_levels_list,
+}
+
+
+def setup():
+    @router.get("/")
+    async def main(
+        request: Request,
+        item_type: ItemType,
+        page: int = 0,
+        keywords: Optional[str] = None,
+    ):
+        if item_type not in compilers:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f'Item "{item_type}" not found.',
+            )
+        data = await request.app.run_cached(
+            compilers[item_type], request.app.base_url
+        )
+        if keywords:
+            # every keyword somewhere in the title
+            words = keywords.lower().split()
+            data = [
+                item
+                for item in data
+                if all(word in str(item.get("title", "")).lower() for word in words)
+            ]
+        per_page = request.app.get_items_per_page(item_type)
+        page = max(page, 0)
+        item_list: ServerItemList = {
+            "pageCount": -(-len(data) // per_page),
+            "items": data[page * per_page : (page + 1) * per_page],
+            "searches": [],
+        }
+        return item_list
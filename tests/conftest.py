@@ -0,0 +1,51 @@
+import os, shutil, sys, tempfile
+from pathlib import Path
+
+import pytest
+
+REPO = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(REPO), str(REPO / "helpers")]
+
+# db.py reads this on import: tests get a scratch database, never sonolus.db
+_db_dir = tempfile.mkdtemp(prefix="sonolus-tests-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_db_dir}/sonolus.db"
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_db_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def db():
+    """Empty tables (and caches) for one test."""
+    import crud
+    from db import engine, init_db
+    from sqlmodel import SQLModel
+
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+    await init_db()
+    crud.users.clear()
+    crud.unlocked_song_ids.clear()
+    yield
+    # pooled connections belong to this test's event loop
+    await engine.dispose()
+
+
+@pytest.fixture
+async def client(db, monkeypatch):
+    """httpx client for the app, in-process. Startup (routes, pools) isn't run."""
+    import httpx
+
+    # app.py reads config.yml from the working directory
+    monkeypatch.chdir(REPO)
+    import app as app_module
+
+    transport = httpx.ASGITransport(app=app_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        yield c
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import crud
+
+pytestmark = pytest.mark.anyio
+
+CREATED_AT = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+async def seed(count: int, same_time: bool = False, **fields):
+    await crud.bulk_create_songs(
+        {
+            "song_id": f"song-{i:03d}",
+            "title": f"Song {i}",
+            "path": f"charts/song-{i:03d}.zip",
+            "created_at": CREATED_AT + timedelta(seconds=0 if same_time else i),
+            **fields,
+        }
+        for i in range(count)
+    )
+
+
+async def walk(limit: int, **filters) -> list:
+    """song_ids of every page, in order."""
+    seen, after = [], None
+    while True:
+        rows = await crud.list_songs_for_user(None, limit, after=after, **filters)
+        seen += [song.song_id for song, _ in rows]
+        if len(rows) < limit:
+            return seen
+        last = rows[-1][0]
+        after = crud.decode_cursor(crud.encode_cursor(last.created_at, last.id))
+
+
+async def test_pages_are_newest_first(db):
+    await seed(7)
+    assert await walk(3) == [f"song-{i:03d}" for i in reversed(range(7))]
+
+
+async def test_equal_created_at_pages_by_id(db):
+    # every song shares created_at: the id tie-break must not skip or repeat any
+    await seed(10, same_time=True)
+    for limit in (1, 3, 10, 11):
+        seen = await walk(limit)
+        assert seen == [f"song-{i:03d}" for i in reversed(range(10))]
+
+
+async def test_page_size_dividing_the_table(db):
+    # a full last page is followed by an empty one, not a repeat
+    await seed(6)
+    rows = await crud.list_songs_for_user(None, 3)
+    last = rows[-1][0]
+    rows = await crud.list_songs_for_user(None, 3, after=(last.created_at, last.id))
+    last = rows[-1][0]
+    assert await crud.list_songs_for_user(None, 3, after=(last.created_at, last.id)) == []
+
+
+async def test_filters_with_cursor(db):
+    await seed(10)
+    assert await walk(2, query="Song 1") == ["song-001"]
+    assert await walk(1, locked=False) == [f"song-{i:03d}" for i in reversed(range(10))]
+    assert await walk(1, locked=True) == []
+
+
+@pytest.mark.parametrize("cursor", ["", "!!!", "bm90IGEgY3Vyc29y", "MjAyNXwx"])
+def test_decode_cursor_rejects_garbage(cursor):
+    with pytest.raises(ValueError):
+        crud.decode_cursor(cursor)
+
+
+def test_cursor_round_trip():
+    assert crud.decode_cursor(crud.encode_cursor(CREATED_AT, 42)) == (CREATED_AT, 42)
+
+
+async def test_route_without_cursor_returns_every_song(client):
+    await seed(60)
+    response = await client.get("/api/charts/")
+    assert response.status_code == 200
+    songs = response.json()
+    assert isinstance(songs, list)
+    assert len(songs) == 60
+    assert set(songs[0]) == {"song_id", "title", "locked", "default_locked", "path"}
+
+
+async def test_route_cursor_pages(client):
+    await seed(5, same_time=True, default_locked=True)
+    seen, cursor = [], ""
+    while cursor is not None:
+        response = await client.get("/api/charts/", params={"cursor": cursor, "limit": 2})
+        page = response.json()
+        seen += page["items"]
+        cursor = page["next"]
+    assert [song["song_id"] for song in seen] == [f"song-{i:03d}" for i in reversed(range(5))]
+    # guests don't see locked songs' paths
+    assert all(song["locked"] and song["path"] is None for song in seen)
+
+
+async def test_route_rejects_bad_cursor(client):
+    response = await client.get("/api/charts/", params={"cursor": "garbage"})
+    assert response.status_code == 400
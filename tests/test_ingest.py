@@ -0,0 +1,155 @@
+from datetime import timedelta
+
+import pytest
+from sqlmodel import update
+
+import crud
+from db import get_session
+from helpers.executors import ExecutorSaturated
+from helpers.ingest import LEASE_SECONDS, MAX_ATTEMPTS, IngestWorker
+from models import IngestJob, utcnow
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeApp:
+    """Stands in for the app's compile pool: runs or fails every job."""
+
+    base_url = "http://localhost"
+
+    def __init__(self, error: Exception = None):
+        self.error = error
+        self.calls = 0
+
+    async def run_blocking(self, func, *args, pool=None):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return '{"name": "compiled"}'
+
+
+async def expire_lease(job_id: int):
+    # as if the job's worker died a lease ago
+    async with get_session() as sess:
+        await sess.exec(
+            update(IngestJob)
+            .where(IngestJob.id == job_id)
+            .values(claimed_at=utcnow() - timedelta(seconds=LEASE_SECONDS + 1))
+        )
+        await sess.commit()
+
+
+async def test_enqueue_is_idempotent(db):
+    first = await crud.enqueue_ingest_job("song", "charts/song/chart.zip")
+    again = await crud.enqueue_ingest_job("song", "charts/other.zip")
+    assert again.id == first.id
+    assert again.path == "charts/song/chart.zip"
+
+
+async def test_claim_takes_the_oldest_queued_job_once(db):
+    first = await crud.enqueue_ingest_job("a", "a.zip")
+    await crud.enqueue_ingest_job("b", "b.zip")
+    job = await crud.claim_ingest_job(LEASE_SECONDS, MAX_ATTEMPTS)
+    assert (job.id, job.status, job.attempts) == (first.id, "running", 1)
+    assert job.claimed_at is not None
+    assert (await crud.claim_ingest_job(LEASE_SECONDS, MAX_ATTEMPTS)).song_id == "b"
+    # both running, within their lease
+    assert await crud.claim_ingest_job(LEASE_SECONDS, MAX_ATTEMPTS) is None
+
+
+async def test_expired_lease_is_claimed_again(db):
+    await crud.enqueue_ingest_job("a", "a.zip")
+    job = await crud.claim_ingest_job(LEASE_SECONDS, MAX_ATTEMPTS)
+    await expire_lease(job.id)
+    again = await crud.claim_ingest_job(LEASE_SECONDS, MAX_ATTEMPTS)
+    assert again.id == job.id
+    assert again.attempts == 2
+    assert again.claimed_at > job.claimed_at
+
+
+async def test_gives_up_after_max_attempts(db):
+    await crud.enqueue_ingest_job("a", "a.zip")
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        job = await crud.claim_ingest_job(LEASE_SECONDS, MAX_ATTEMPTS)
+        assert job.attempts == attempt
+        await expire_lease(job.id)
+    assert await crud.claim_ingest_job(LEASE_SECONDS, MAX_ATTEMPTS) is None
+    job = await crud.get_ingest_job(job.id)
+    assert job.status == "failed"
+    assert job.error == f"Gave up after {MAX_ATTEMPTS} attempts"
+    assert job.finished_at is not None
+
+
+async def test_release_does_not_count_the_attempt(db):
+    await crud.enqueue_ingest_job("a", "a.zip")
+    job = await crud.claim_ingest_job(LEASE_SECONDS, MAX_ATTEMPTS)
+    await crud.release_ingest_job(job.id)
+    job = await crud.get_ingest_job(job.id)
+    assert (job.status, job.attempts, job.claimed_at) == ("queued", 0, None)
+
+
+async def test_finish_only_a_running_job(db):
+    await crud.enqueue_ingest_job("a", "a.zip")
+    job = await crud.claim_ingest_job(LEASE_SECONDS, MAX_ATTEMPTS)
+    await crud.finish_ingest_job(job.id, result="{}")
+    # a late second finish, e.g. from a worker whose lease ran out
+    await crud.finish_ingest_job(job.id, error="too late")
+    job = await crud.get_ingest_job(job.id)
+    assert (job.status, job.result, job.error) == ("done", "{}", None)
+
+
+async def test_retry_queues_a_failed_job_with_a_new_id(db):
+    await crud.enqueue_ingest_job("a", "a.zip")
+    job = await crud.claim_ingest_job(LEASE_SECONDS, MAX_ATTEMPTS)
+    assert await crud.retry_ingest_job(job.id) is None  # still running
+    await crud.finish_ingest_job(job.id, error="broken")
+    retry = await crud.retry_ingest_job(job.id)
+    assert retry.id > job.id
+    assert (retry.song_id, retry.status, retry.attempts) == ("a", "queued", 0)
+    assert await crud.get_ingest_job(job.id) is None
+    assert await crud.retry_ingest_job(12345) is None
+
+
+async def test_finished_jobs_scan_from_the_oldest_unfinished(db):
+    ids = [(await crud.enqueue_ingest_job(name, "x.zip")).id for name in "abc"]
+    for _ in ids:
+        job = await crud.claim_ingest_job(LEASE_SECONDS, MAX_ATTEMPTS)
+        if job.song_id != "b":
+            await crud.finish_ingest_job(job.id, result="{}")
+    jobs, floor = await crud.finished_ingest_jobs(0, set())
+    assert [job.id for job in jobs] == [ids[0], ids[2]]
+    # "b" is still running, so the scan restarts there
+    assert floor == ids[1]
+    jobs, floor = await crud.finished_ingest_jobs(floor, {ids[2]})
+    assert jobs == []
+
+
+async def test_worker_compiles_a_job(db):
+    await crud.enqueue_ingest_job("a", "a.zip")
+    worker = IngestWorker(None)
+    app = FakeApp()
+    assert await worker.process_one(app) is True
+    assert await worker.process_one(app) is False
+    job = (await crud.list_ingest_jobs())[0]
+    assert (job.status, job.attempts) == ("done", 1)
+
+
+async def test_worker_fails_a_broken_chart_without_retrying(db):
+    await crud.enqueue_ingest_job("a", "a.zip")
+    app = FakeApp(ValueError("not a zip"))
+    assert await IngestWorker(None).process_one(app) is True
+    job = (await crud.list_ingest_jobs())[0]
+    assert job.status == "failed"
+    assert job.error == "ValueError: not a zip"
+    assert await IngestWorker(None).process_one(app) is False
+    assert app.calls == 1
+
+
+async def test_worker_releases_a_job_when_the_pool_is_full(db):
+    await crud.enqueue_ingest_job("a", "a.zip")
+    app = FakeApp(ExecutorSaturated("compile", retry_after=0))
+    for _ in range(MAX_ATTEMPTS + 1):
+        assert await IngestWorker(None).process_one(app) is False
+    # saturation never uses up the job's attempts
+    job = (await crud.list_ingest_jobs())[0]
+    assert (job.status, job.attempts) == ("queued", 0)
@@ -0,0 +1,96 @@
+import gzip, io, json
+
+import pytest
+
+from helpers import level_stats
+from helpers.level_stats import beat_to_time, extract_level_stats, iter_level_data
+
+
+def entity(archetype, **data):
+    return {
+        "archetype": archetype,
+        "data": [{"name": name, "value": value} for name, value in data.items()],
+    }
+
+
+LEVEL = {
+    "bgmOffset": -0.125,
+    "entities": [
+        entity("Initialization"),
+        entity("#BPM_CHANGE", **{"#BEAT": 0, "#BPM": 120}),
+        entity("#BPM_CHANGE", **{"#BEAT": 8, "#BPM": 240}),
+        entity("NormalTapNote", **{"#BEAT": 4.5}),
+        entity("CriticalFlickNote", **{"#BEAT": 12}),
+        entity("IgnoredSlideTickNote", **{"#BEAT": 20}),
+        entity("NormalTapNote", **{"#BEAT": 1.25e1}),
+    ],
+    "extra": {"nested": [1, 2.5, "x"]},
+}
+
+
+def level_bytes(level=LEVEL, compress=False) -> io.BytesIO:
+    data = json.dumps(level).encode()
+    return io.BytesIO(gzip.compress(data) if compress else data)
+
+
+def test_stats():
+    stats = extract_level_stats(level_bytes())
+    assert stats["entities"] == 7
+    assert stats["notes"] == 3
+    assert stats["archetypes"]["NormalTapNote"] == 2
+    assert stats["bgmOffset"] == -0.125
+    assert stats["bpmChanges"] == [(0.0, 120.0), (8.0, 240.0)]
+    assert stats["firstNoteBeat"] == 4.5
+    assert stats["lastNoteBeat"] == 12.5
+    # 8 beats at 120 bpm, then 4.5 at 240
+    assert stats["lastNoteTime"] == pytest.approx(4 + 4.5 * 60 / 240)
+
+
+def test_gzip_is_read_like_plain_json():
+    assert extract_level_stats(level_bytes(compress=True)) == extract_level_stats(
+        level_bytes()
+    )
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 64])
+def test_values_split_across_chunks(monkeypatch, chunk_size):
+    # numbers, strings and objects cut at every possible offset
+    monkeypatch.setattr(level_stats, "_CHUNK_SIZE", chunk_size)
+    items = list(iter_level_data(level_bytes()))
+    assert items[0] == ("bgmOffset", -0.125)
+    assert [value for key, value in items if key == "entity"] == LEVEL["entities"]
+    assert items[-1] == ("extra", LEVEL["extra"])
+
+
+def test_empty_level():
+    assert list(iter_level_data(io.BytesIO(b" { } "))) == []
+    stats = extract_level_stats(io.BytesIO(b'{"entities": []}'))
+    assert stats["entities"] == 0
+    assert stats["firstNoteTime"] is None
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"",
+        b"[]",
+        b'{"entities": [',
+        b'{"entities": [{"archetype": "NormalTapNote"',
+        b'{"entities": [] "bgmOffset": 0}',
+        b'{"entities": [1 2]}',
+        json.dumps(LEVEL).encode()[:-20],
+    ],
+)
+def test_malformed_or_truncated_data_raises(data):
+    with pytest.raises(ValueError):
+        extract_level_stats(io.BytesIO(data))
+
+
+def test_truncated_gzip_raises():
+    data = gzip.compress(json.dumps(LEVEL).encode())
+    with pytest.raises((ValueError, EOFError)):
+        extract_level_stats(io.BytesIO(data[: len(data) // 2]))
+
+
+def test_beat_to_time_without_bpm_changes():
+    assert beat_to_time(30, []) == 30.0
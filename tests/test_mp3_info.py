@@ -0,0 +1,192 @@
+import io
+
+import pytest
+
+from helpers.mp3_info import (
+    find_frame,
+    id3v2_size,
+    parse_frame_header,
+    read_mp3_info,
+    slice_mp3,
+)
+
+# MPEG-1 layer III, 128 kbps, 44.1 kHz, stereo: 417 bytes and 1152 samples per frame
+HEADER = bytes([0xFF, 0xFB, 0x90, 0x00])
+FRAME_LENGTH = 417
+FRAME_SECONDS = 1152 / 44100
+
+
+def frame(header: bytes = HEADER, payload: bytes = b"") -> bytes:
+    length = parse_frame_header(header).length
+    return header + payload + bytes(length - 4 - len(payload))
+
+
+def xing_frame(frames: int, nbytes: int, tag: bytes = b"Xing") -> bytes:
+    # MPEG-1 stereo: 32 bytes of side info before the tag
+    flags = (3).to_bytes(4, "big")
+    payload = bytes(32) + tag + flags + frames.to_bytes(4, "big") + nbytes.to_bytes(4, "big")
+    return frame(payload=payload)
+
+
+def vbri_frame(frames: int, nbytes: int) -> bytes:
+    payload = bytes(32) + b"VBRI" + bytes(6) + nbytes.to_bytes(4, "big")
+    payload += frames.to_bytes(4, "big")
+    return frame(payload=payload)
+
+
+def id3v2_tag(size: int) -> bytes:
+    syncsafe = bytes((size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+    return b"ID3\x04\x00\x00" + syncsafe + bytes(size)
+
+
+def info(data: bytes):
+    return read_mp3_info(io.BytesIO(data), len(data))
+
+
+def test_parse_frame_header():
+    header = parse_frame_header(HEADER)
+    assert header.version == 1
+    assert header.layer == 3
+    assert header.bitrate == 128
+    assert header.sample_rate == 44100
+    assert header.length == FRAME_LENGTH
+    assert header.channels == 2
+    # padding bit adds a byte, mode 3 is mono
+    assert parse_frame_header(bytes([0xFF, 0xFB, 0x92, 0xC0])).length == FRAME_LENGTH + 1
+    assert parse_frame_header(bytes([0xFF, 0xFB, 0x90, 0xC0])).channels == 1
+
+
+@pytest.mark.parametrize(
+    "header",
+    [
+        b"",
+        b"\xff\xfb\x90",  # short
+        b"\x00\xfb\x90\x00",  # no sync
+        b"\xff\xfb\x00\x00",  # free format bitrate
+        b"\xff\xfb\xf0\x00",  # invalid bitrate
+        b"\xff\xfb\x9c\x00",  # reserved sample rate
+        b"\xff\xeb\x90\x00",  # reserved version
+        b"\xff\xf9\x90\x00",  # reserved layer
+    ],
+)
+def test_parse_frame_header_rejects(header):
+    assert parse_frame_header(header) is None
+
+
+def test_cbr():
+    result = info(frame() * 100)
+    assert result["bitrate"] == 128
+    assert result["sampleRate"] == 44100
+    assert not result["vbr"]
+    assert result["duration"] == pytest.approx(100 * FRAME_LENGTH * 8 / 128000, abs=1e-3)
+
+
+def test_leading_id3v2_tag_is_skipped():
+    tag = id3v2_tag(5000)
+    assert id3v2_size(tag) == len(tag)
+    assert info(tag + frame() * 100) == info(frame() * 100)
+
+
+def test_sync_bytes_in_garbage_need_a_confirming_frame():
+    # 0xff followed by a valid-looking header, but no frame after it
+    data = b"\x00\xff\xfb\x90\x00\x12" + frame() * 10
+    assert find_frame(data)[0] == 6
+
+
+def test_xing_frame_count():
+    # 1000 frames of 256 kbps on average
+    nbytes = round(1000 * FRAME_SECONDS * 256000 / 8)
+    result = info(xing_frame(1000, nbytes) + frame() * 10)
+    assert result["duration"] == pytest.approx(1000 * FRAME_SECONDS, abs=1e-3)
+    assert result["bitrate"] == 256
+    assert result["vbr"]
+
+
+def test_info_tag_on_cbr_file():
+    nbytes = 100 * FRAME_LENGTH
+    result = info(xing_frame(100, nbytes, tag=b"Info") + frame() * 100)
+    assert result["bitrate"] == 128
+    assert not result["vbr"]
+
+
+def test_vbri_frame_count():
+    nbytes = round(500 * FRAME_SECONDS * 192000 / 8)
+    result = info(vbri_frame(500, nbytes) + frame() * 10)
+    assert result["duration"] == pytest.approx(500 * FRAME_SECONDS, abs=1e-3)
+    assert result["bitrate"] == 192
+
+
+def test_vbr_header_without_frame_count_falls_back_to_cbr():
+    result = info(xing_frame(0, 0) + frame() * 9)
+    assert result["duration"] == pytest.approx(10 * FRAME_LENGTH * 8 / 128000, abs=1e-3)
+    assert not result["vbr"]
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"",
+        b"\x00" * 4096,
+        b"not an mp3 at all" * 100,
+        b"\xff" * 4096,
+        id3v2_tag(100),  # tag and nothing after it
+        id3v2_tag(100)[:20],  # tag claiming more bytes than there are
+    ],
+)
+def test_not_mp3(data):
+    assert info(data) is None
+
+
+def test_truncated_stream():
+    # cut mid-frame: still read from the first frames, sized by what's there
+    data = (frame() * 10)[: FRAME_LENGTH * 5 + 100]
+    result = info(data)
+    assert result["bitrate"] == 128
+    assert result["duration"] == pytest.approx(len(data) * 8 / 128000, abs=1e-3)
+
+
+def test_truncated_xing_frame():
+    # the file ends right after the Xing tag, before its flags and counts
+    result = info(xing_frame(1000, 10**6)[:40])
+    assert result["bitrate"] == 128
+    assert not result["vbr"]
+
+
+def numbered_frames(count: int) -> bytes:
+    # the first payload byte tells frames apart
+    return b"".join(frame(payload=bytes([i % 256])) for i in range(count))
+
+
+def test_slice_mp3():
+    data = numbered_frames(100)
+    clip = slice_mp3(data, 1.0, 0.5)
+    first = int(1.0 // FRAME_SECONDS)  # the frame playing at 1 s
+    assert clip[:4] == HEADER
+    assert clip[4] == first
+    assert len(clip) % FRAME_LENGTH == 0
+    # whole frames, covering the half second asked for
+    last = len(clip) // FRAME_LENGTH + first
+    assert first * FRAME_SECONDS <= 1.0
+    assert last * FRAME_SECONDS >= 1.5
+    assert clip == data[first * FRAME_LENGTH : last * FRAME_LENGTH]
+
+
+def test_slice_drops_tags_and_xing_frame():
+    data = id3v2_tag(300) + xing_frame(50, 50 * FRAME_LENGTH) + numbered_frames(50)
+    clip = slice_mp3(data, 0, 10)
+    assert clip == numbered_frames(50)
+
+
+def test_slice_past_the_end():
+    assert slice_mp3(frame() * 10, 60, 5) is None
+
+
+def test_slice_truncated_stream():
+    # the cut-off last frame is left out
+    data = numbered_frames(10)[: FRAME_LENGTH * 10 - 50]
+    assert slice_mp3(data, 0, 60) == numbered_frames(9)
+
+
+@pytest.mark.parametrize("data", [b"", b"\x00" * 1000, id3v2_tag(100)])
+def test_slice_not_mp3(data):
+    assert slice_mp3(data, 0, 5) is None
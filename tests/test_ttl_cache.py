@@ -0,0 +1,86 @@
+import pytest
+
+from helpers import ttl_cache
+from helpers.ttl_cache import IntSet, TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ttl_cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_entries_expire(clock):
+    cache = TTLCache(10, ttl=30)
+    cache.set("a", 1)
+    clock[0] += 30
+    assert cache.get("a") == 1
+    clock[0] += 0.001
+    assert cache.get("a") is None
+    # expired entries are dropped on read
+    assert len(cache) == 0
+
+
+def test_entry_ttl_only_shortens(clock):
+    cache = TTLCache(10, ttl=30)
+    cache.set("short", 1, ttl=5)
+    cache.set("long", 2, ttl=300)
+    clock[0] += 10
+    assert cache.get("short") is None
+    assert cache.get("long") == 2
+    clock[0] += 25
+    assert cache.get("long") is None
+
+
+def test_zero_or_negative_ttl_is_never_served(clock):
+    # e.g. a token that expired while it was being checked
+    cache = TTLCache(10, ttl=30)
+    cache.set("a", 1, ttl=-5)
+    assert cache.get("a") is None
+
+
+def test_set_again_refreshes_expiry(clock):
+    cache = TTLCache(10, ttl=30)
+    cache.set("a", 1)
+    clock[0] += 20
+    cache.set("a", 2)
+    clock[0] += 20
+    assert cache.get("a") == 2
+
+
+def test_least_recently_used_is_evicted(clock):
+    cache = TTLCache(2, ttl=30)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_falsy_values_are_cached(clock):
+    cache = TTLCache(10, ttl=30)
+    cache.set("empty", IntSet([]))
+    assert cache.get("empty") is not None
+
+
+def test_pop_and_clear(clock):
+    cache = TTLCache(10, ttl=30)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.pop("a")
+    cache.pop("missing")
+    assert cache.get("a") is None
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_int_set():
+    values = IntSet([5, 1, 5, -3, 2**40])
+    assert len(values) == 4
+    assert list(values) == [-3, 1, 5, 2**40]
+    assert 5 in values and -3 in values and 2**40 in values
+    assert 0 not in values and 6 not in values and 2**41 not in values
+    assert 1 not in IntSet([])
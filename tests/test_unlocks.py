@@ -0,0 +1,85 @@
+import pytest
+from sqlmodel import func, select
+
+import crud
+from db import get_session
+from models import UserUnlock
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def catalog(db):
+    for name in ("alice", "bob"):
+        await crud.create_user(name, "not-a-real-hash")
+    await crud.bulk_create_songs(
+        {"song_id": song_id, "title": song_id, "path": "x", "default_locked": True}
+        for song_id in ("a", "b", "c")
+    )
+
+
+async def unlock_count() -> int:
+    async with get_session() as sess:
+        return (await sess.exec(select(func.count()).select_from(UserUnlock))).one()
+
+
+async def test_unlock_song_is_idempotent(catalog):
+    assert await crud.unlock_song("alice", "a") is True
+    assert await crud.unlock_song("alice", "a") is False
+    assert await unlock_count() == 1
+
+
+async def test_unlock_song_unknown_user_or_song(catalog):
+    assert await crud.unlock_song("nobody", "a") is None
+    assert await crud.unlock_song("alice", "missing") is None
+    assert await unlock_count() == 0
+
+
+async def test_grant_unlocks(catalog):
+    await crud.unlock_song("bob", "b")
+    result = await crud.grant_unlocks(
+        ["alice", "bob", "alice", "carol"], ["a", "b", "zzz", "a"]
+    )
+    assert result == {
+        "granted": 3,
+        "already_unlocked": 1,
+        "missing_users": ["carol"],
+        "missing_songs": ["zzz"],
+    }
+    assert await unlock_count() == 4
+    # granting again changes nothing
+    again = await crud.grant_unlocks(["alice", "bob"], ["a", "b"])
+    assert again["granted"] == 0
+    assert again["already_unlocked"] == 4
+
+
+async def test_grant_unlocks_nothing_found(catalog):
+    result = await crud.grant_unlocks(["carol"], ["zzz"])
+    assert result["granted"] == 0
+    assert result["already_unlocked"] == 0
+
+
+async def test_unlocks_show_in_listing(catalog):
+    await crud.unlock_song("alice", "b")
+    rows = await crud.list_songs_for_user("alice", 10, locked=False)
+    assert [song.song_id for song, _ in rows] == ["b"]
+    rows = await crud.list_songs_for_user("bob", 10, locked=False)
+    assert rows == []
+
+
+async def test_unlocks_invalidate_the_cached_set(catalog):
+    alice = await crud.get_user_id("alice")
+    bob = await crud.get_user_id("bob")
+    assert len(await crud.get_unlocked_song_ids(alice)) == 0
+    assert len(await crud.get_unlocked_song_ids(bob)) == 0
+    await crud.unlock_song("alice", "a")
+    assert len(await crud.get_unlocked_song_ids(alice)) == 1
+    await crud.grant_unlocks(["bob"], ["a", "c"])
+    assert len(await crud.get_unlocked_song_ids(bob)) == 2
+    # listing reads the locks from that set
+    rows = await crud.list_songs_for_user("alice", 10)
+    assert {song.song_id: locked for song, locked in rows} == {
+        "a": False,
+        "b": True,
+        "c": True,
+    }
@@ -1,7 +1,4 @@
-import base64, time
-from cryptography.hazmat.primitives.asymmetric import ec
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric.utils import encode_dss_signature
+import base64, functools, time
 
 _SONOLUS_JWK = {
     "kty": "EC",
@@ -14,17 +11,23 @@ def _b64u_decode(s: str) -> bytes:
     s += "=" * (-len(s) % 4)
     return base64.urlsafe_b64decode(s.encode())
 
+@functools.lru_cache(maxsize=None)
 def _pubkey():
+    # cryptography is only loaded once the first signed request comes in
+    from cryptography.hazmat.primitives.asymmetric import ec
+
     x = int.from_bytes(_b64u_decode(_SONOLUS_JWK["x"]), "big")
     y = int.from_bytes(_b64u_decode(_SONOLUS_JWK["y"]), "big")
     nums = ec.EllipticCurvePublicNumbers(x, y, ec.SECP256R1())
     return nums.public_key()
 
-_PUB = _pubkey()
-
 def verify_sonolus_signature(raw_body: bytes, sig_b64u: str | None) -> bool:
     if not sig_b64u:
         return False
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.hazmat.primitives.asymmetric.utils import encode_dss_signature
+
     try:
         sig = _b64u_decode(sig_b64u)
         half = len(sig) // 2
@@ -33,7 +36,7 @@ def verify_sonolus_signature(raw_body: bytes, sig_b64u: str | None) -> bool:
             r = int.from_bytes(sig[:half], "big")
             s = int.from_bytes(sig[half:], "big")
             sig = encode_dss_signature(r, s)
-        _PUB.verify(sig, raw_body, ec.ECDSA(hashes.SHA256()))
+        _pubkey().verify(sig, raw_body, ec.ECDSA(hashes.SHA256()))
         return True
     except Exception:
         return False